@@ -1,3 +1,4 @@
+import functools
 import os
 from typing import Optional
 from pydantic_settings import BaseSettings
@@ -13,9 +14,15 @@ class Settings(BaseSettings):
     openai_model: str = "gpt-4o-mini"
     openai_temperature: float = 0.7
     openai_max_tokens: int = 2000
+    openai_concurrency: int = 10
+    openai_max_retries: int = 5
     
-    # CORS Configuration
-    cors_origins: list = ["*"]
+    # CORS Configuration (tuple so the allow-list is a frozen constant)
+    cors_origins: tuple = ("*",)
+
+    # Session storage
+    redis_url: Optional[str] = os.getenv("REDIS_URL")
+    session_ttl: int = 3600
     
     # Logging Configuration
     log_level: str = "INFO"
@@ -31,6 +38,7 @@ class Settings(BaseSettings):
     
     # Feature flags
     enable_ai_fallback: bool = True
+    enable_one_shot_pipeline: bool = True
     enable_email_notifications: bool = False
     enable_audit_logging: bool = True
     
@@ -38,4 +46,18 @@ class Settings(BaseSettings):
         env_file = ".env"
         case_sensitive = False
 
-settings = Settings()
+@functools.lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide Settings instance, built on first use.
+
+    Memoized so .env parsing and field validation run once per process;
+    tests can call get_settings.cache_clear() for isolation.
+    """
+    return Settings()
+
+def __getattr__(name):
+    # Keep `from app.config import settings` working for existing callers
+    # while deferring Settings construction until first access
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,25 +1,49 @@
 # Standard library imports
-import json
+import asyncio
+import hashlib
 import logging
 import os
-from datetime import datetime
+import time
+from collections import deque
+from datetime import datetime, timezone
 from typing import Dict, Any, Optional
 
 # Third-party imports
+import orjson
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder
 
 # Local application imports
+from app.config import settings
 from app.models import TranscriptRequest, IncidentResponse
+from app.session_store import SessionAnalysis, SessionStore
 from app.services.analyzer import PolicyAnalyzer
 from app.services.email_generator import EmailGenerator
 from app.services.email_updater import EmailUpdater
+from app.services.one_shot import OneShotGenerator
 from app.services.report_generator import ReportGenerator
 from app.services.report_updater import ReportUpdater
 
 # OpenAI import
-from openai import OpenAI
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    AuthenticationError,
+    PermissionDeniedError,
+    RateLimitError,
+)
+
+from app.services.openai_client import (
+    get_async_openai_client,
+    get_openai_client,
+    shared_async_http_client,
+)
 
 # Configure detailed logging
 logging.basicConfig(
@@ -28,26 +52,170 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Emma Incident Response System")
+def _orjson_default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson.
+
+    Several times faster than stdlib json on the nested report/email payloads
+    these endpoints return; datetimes serialize natively and Pydantic models
+    fall back to model_dump().
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+class TimingMiddleware:
+    """Pure-ASGI middleware that stamps x-response-time on HTTP responses.
+
+    Implemented directly against the ASGI protocol rather than
+    BaseHTTPMiddleware, so no Request/Response objects or wrapper tasks are
+    allocated per call.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed_ms = (time.perf_counter() - start) * 1000.0
+                message["headers"].append((b"x-response-time", f"{elapsed_ms:.2f}ms".encode()))
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
+
+class SSEExemptGZipResponder(GZipResponder):
+    """GZipResponder that passes text/event-stream responses through untouched"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._passthrough = False
+
+    async def send_with_gzip(self, message) -> None:
+        if self._passthrough:
+            await self.send(message)
+            return
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if content_type.startswith("text/event-stream"):
+                self._passthrough = True
+                await self.send(message)
+                return
+        await super().send_with_gzip(message)
+
+class SSEExemptGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves SSE responses uncompressed.
+
+    zlib buffers small writes internally, so compressing the /analyze/stream
+    response would hold each per-stage event in the compressor until the
+    stream ends — defeating the endpoint's time-to-first-result purpose. The
+    content type is only known once the response starts, so the exemption
+    lives in the responder's send path; every other response gzips as before.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = SSEExemptGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+app = FastAPI(title="Emma Incident Response System", default_response_class=ORJSONResponse)
+app.add_middleware(TimingMiddleware)
 
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=settings.cors_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=86400,  # let browsers cache preflight responses for a day
 )
 
+# Compress the large /analyze and /update_analysis payloads (full transcript,
+# report, and email in one JSON body); level 5 trades a few ms of CPU for
+# 70-90% smaller responses, and the 1KB floor skips / and /health. SSE
+# responses are exempt so streamed events aren't held in the compressor.
+app.add_middleware(SSEExemptGZipMiddleware, minimum_size=1000, compresslevel=5)
+
 # Initialize services
 policy_analyzer = PolicyAnalyzer()
 report_generator = ReportGenerator()
 email_generator = EmailGenerator()
 report_updater = ReportUpdater()
 email_updater = EmailUpdater()
+one_shot_generator = OneShotGenerator()
+
+# Serializes key rotations so concurrent /api/update_keys calls can't
+# interleave the env/settings/client updates
+_rekey_lock = asyncio.Lock()
+
+# Store conversation context (Redis-backed when REDIS_URL is configured)
+conversation_contexts = SessionStore(redis_url=settings.redis_url, ttl=settings.session_ttl)
+
+# Cached view of the OpenAI key for /health, which load balancers poll
+# frequently; refreshed by /api/update_keys so we avoid per-probe env lookups
+_openai_key = os.getenv("OPENAI_API_KEY", "")
+
+# Second-resolution ISO timestamp cache for session audit stamps; avoids a
+# clock syscall plus tz lookup and strftime on every request
+_now_iso_cache = (0, "")
+
+def _now_iso() -> str:
+    global _now_iso_cache
+    now = int(time.time())
+    if now != _now_iso_cache[0]:
+        _now_iso_cache = (now, datetime.now(timezone.utc).isoformat())
+    return _now_iso_cache[1]
+
+def _tid(s: str) -> str:
+    """Short content hash for correlating log lines.
+
+    Logged instead of raw transcript/update text so transcripts (which carry
+    names and health details) stay out of the logs entirely.
+    """
+    return hashlib.blake2b(s.encode(), digest_size=8).hexdigest()
+
+# Pool of reusable update_context dicts so /update_analysis doesn't allocate
+# and discard one per call. The event loop is single-threaded, so plain deque
+# operations need no locking; maxlen bounds the pool.
+_ctx_pool: deque = deque(maxlen=256)
+
+# Content-addressed cache for /analyze pipeline results, keyed by a BLAKE2b
+# digest of the transcript so duplicate submissions (client retries,
+# double-clicks, regenerate flows) skip the paid LLM calls entirely
+_analyze_cache: Dict[str, Any] = {}
+_ANALYZE_CACHE_TTL = 600
+_ANALYZE_CACHE_MAX = 1024
 
-# Store conversation context
-conversation_contexts = {}
+def _analyze_cache_get(key: str):
+    entry = _analyze_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, value = entry
+    if expires_at < time.monotonic():
+        del _analyze_cache[key]
+        return None
+    return value
+
+def _analyze_cache_put(key: str, value) -> None:
+    if len(_analyze_cache) >= _ANALYZE_CACHE_MAX:
+        # Evict the entries closest to expiry to keep the cache bounded
+        for stale in sorted(_analyze_cache, key=lambda k: _analyze_cache[k][0])[:_ANALYZE_CACHE_MAX // 4]:
+            del _analyze_cache[stale]
+    _analyze_cache[key] = (time.monotonic() + _ANALYZE_CACHE_TTL, value)
 
 @app.get("/")
 async def root():
@@ -59,198 +227,318 @@ async def analyze_transcript(request: TranscriptRequest):
     Analyze transcript against policies and generate incident report
     """
     try:
-        logger.info(f"Received transcript for analysis: {request.transcript[:100]}...")
-        
-        # Get or create conversation context
+        transcript_hash = hashlib.blake2b(request.transcript.encode(), digest_size=16).hexdigest()
+        logger.info("Received transcript for analysis tid=%s len=%d", transcript_hash[:16], len(request.transcript))
+
         session_id = request.metadata.get("session_id", "default")
-        context = conversation_contexts.get(session_id, {})
-        
-        # Step 1: Analyze transcript against policies
-        logger.info("Starting policy analysis...")
-        analysis_result = await policy_analyzer.analyze(request.transcript)
-        logger.info(f"Analysis complete: {json.dumps(analysis_result, indent=2)}")
-        
-        # Step 2: Generate incident report
-        logger.info("Generating incident report...")
-        incident_report = await report_generator.generate_report(
-            transcript=request.transcript,
-            analysis=analysis_result
-        )
-        logger.info(f"Incident report generated: {json.dumps(incident_report, indent=2)}")
+
+        cached = _analyze_cache_get(transcript_hash)
+        if cached is not None:
+            logger.info("Returning cached pipeline results tid=%s", transcript_hash[:16])
+            cache_status = "HIT"
+            analysis_result, incident_report, email_draft = cached
+        else:
+            cache_status = "MISS"
+            results = None
+            if settings.enable_one_shot_pipeline:
+                # Try the single-call pipeline first: one round-trip returns
+                # analysis, report, and email together
+                logger.info("Running one-shot analysis pipeline...")
+                results = await one_shot_generator.generate(request.transcript)
+
+            if results is not None:
+                analysis_result, incident_report, email_draft = results
+                logger.debug("One-shot pipeline complete: %s", analysis_result)
+            else:
+                # Staged pipeline (also the fallback when one-shot fails)
+                # Step 1: Analyze transcript against policies
+                logger.info("Starting policy analysis...")
+                analysis_result = await policy_analyzer.analyze(request.transcript)
+                logger.debug("Analysis complete: %s", analysis_result)
+
+                # Steps 2+3: report and email both depend only on the
+                # transcript and analysis, so their LLM calls run concurrently
+                logger.info("Generating incident report and email draft...")
+                incident_report, email_draft = await asyncio.gather(
+                    report_generator.generate_report(
+                        transcript=request.transcript,
+                        analysis=analysis_result
+                    ),
+                    email_generator.generate_email(
+                        analysis=analysis_result,
+                        transcript=request.transcript
+                    )
+                )
+                logger.debug("Incident report generated: %s", incident_report)
+                logger.debug("Email draft generated: %s", email_draft)
+
+            _analyze_cache_put(transcript_hash, (analysis_result, incident_report, email_draft))
         
-        # Step 3: Generate email draft
-        logger.info("Generating email draft...")
-        email_draft = await email_generator.generate_email(
-            incident_report=incident_report,
-            analysis=analysis_result
-        )
-        logger.info(f"Email draft generated: {json.dumps(email_draft, indent=2)}")
+        # Store in context, built as a single literal so the dict is allocated
+        # at its final size
+        context = {
+            "last_analysis": SessionAnalysis(
+                transcript=request.transcript,
+                analysis=analysis_result,
+                incident_report=incident_report,
+                email_draft=email_draft,
+                timestamp=_now_iso()
+            )
+        }
+        await conversation_contexts.set(session_id, context)
         
-        # Store in context
-        context["last_analysis"] = {
-            "transcript": request.transcript,
-            "analysis": analysis_result,
+        # Prepare response. Built as a prebuilt ORJSONResponse: the payload
+        # comes from our own generators, so FastAPI's per-field validation
+        # walk over IncidentResponse (kept on the decorator for the OpenAPI
+        # schema) is skipped on the return path.
+        payload = {
+            "analysis_summary": analysis_result.get("summary", "Analysis completed successfully."),
             "incident_report": incident_report,
             "email_draft": email_draft,
-            "timestamp": datetime.now().isoformat()
+            "policy_violations": analysis_result.get("violations", []),
+            "recommendations": analysis_result.get("recommendations", []),
+            "confidence_score": analysis_result.get("confidence_score", 0.95)
         }
-        conversation_contexts[session_id] = context
-        
-        # Prepare response
-        response = IncidentResponse(
-            analysis_summary=analysis_result.get("summary", "Analysis completed successfully."),
-            incident_report=incident_report,
-            email_draft=email_draft,
-            policy_violations=analysis_result.get("violations", []),
-            recommendations=analysis_result.get("recommendations", []),
-            confidence_score=analysis_result.get("confidence_score", 0.95)
-        )
-        
+
         logger.info("Response prepared successfully")
-        return response
+        return ORJSONResponse(payload, headers={"X-Cache": cache_status})
         
     except Exception as e:
         logger.error(f"Error processing transcript: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error processing transcript: {str(e)}")
 
+@app.post("/analyze/stream")
+async def analyze_transcript_stream(request: TranscriptRequest):
+    """
+    SSE variant of /analyze: each pipeline stage is pushed as its own event
+    (analysis, incident_report, email_draft) the moment it completes, so the
+    client sees the first result after one LLM round-trip instead of waiting
+    for the whole pipeline. /analyze keeps the blocking shape.
+    """
+    session_id = request.metadata.get("session_id", "default")
+
+    async def event_generator():
+        try:
+            logger.info("Received transcript for streaming analysis tid=%s len=%d", _tid(request.transcript), len(request.transcript))
+
+            analysis_result = await policy_analyzer.analyze(request.transcript)
+            yield b"event: analysis\ndata: " + orjson.dumps(analysis_result) + b"\n\n"
+
+            # Report and email run concurrently; each is flushed as it lands
+            report_task = asyncio.ensure_future(report_generator.generate_report(
+                transcript=request.transcript,
+                analysis=analysis_result
+            ))
+            email_task = asyncio.ensure_future(email_generator.generate_email(
+                analysis=analysis_result,
+                transcript=request.transcript
+            ))
+
+            incident_report = await report_task
+            yield b"event: incident_report\ndata: " + orjson.dumps(incident_report) + b"\n\n"
+
+            email_draft = await email_task
+            yield b"event: email_draft\ndata: " + orjson.dumps(email_draft) + b"\n\n"
+
+            context = {
+                "last_analysis": SessionAnalysis(
+                    transcript=request.transcript,
+                    analysis=analysis_result,
+                    incident_report=incident_report,
+                    email_draft=email_draft,
+                    timestamp=_now_iso()
+                )
+            }
+            await conversation_contexts.set(session_id, context)
+            yield b"event: done\ndata: {}\n\n"
+
+        except Exception as e:
+            logger.error(f"Error in streaming analysis: {str(e)}", exc_info=True)
+            yield b"event: error\ndata: " + orjson.dumps({"detail": str(e)}) + b"\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+async def _handle_report_update(last_analysis: SessionAnalysis, new_info: str, update_context: Dict[str, Any]):
+    """Apply new information to the stored incident report"""
+    # Validate original report exists
+    if not last_analysis.incident_report:
+        raise ValueError("No incident report found to update")
+
+    logger.info("Updating incident report with new info tid=%s len=%d", _tid(new_info), len(new_info))
+
+    # Log current report data for debugging
+    current_report = last_analysis.incident_report
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Current report data being sent to LLM: %s", orjson.dumps(current_report).decode())
+
+    # Update incident report using LLM
+    updated_report = await report_updater.update_report(
+        original_report=current_report,
+        update_info=new_info,
+        context=update_context
+    )
+
+    # Verify update was successful
+    if updated_report == last_analysis.incident_report:
+        logger.warning("No changes detected in updated report")
+    else:
+        logger.info("Incident report successfully updated")
+
+    last_analysis.incident_report = updated_report
+    return updated_report, last_analysis.email_draft  # Keep original email
+
+async def _handle_email_update(last_analysis: SessionAnalysis, new_info: str, update_context: Dict[str, Any]):
+    """Apply new information to the stored email draft"""
+    # Validate original email exists
+    if not last_analysis.email_draft:
+        raise ValueError("No email draft found to update")
+
+    logger.info("Updating email draft with new info tid=%s len=%d", _tid(new_info), len(new_info))
+
+    # Log current email data for debugging
+    current_email = last_analysis.email_draft
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Current email data being sent to LLM: %s", orjson.dumps(current_email).decode())
+
+    # Update email using LLM
+    updated_email = await email_updater.update_email(
+        original_email=current_email,
+        update_info=new_info,
+        context=update_context
+    )
+
+    # Verify update was successful
+    if updated_email == last_analysis.email_draft:
+        logger.warning("No changes detected in updated email")
+    else:
+        logger.info("Email draft successfully updated")
+
+    last_analysis.email_draft = updated_email
+    return last_analysis.incident_report, updated_email  # Keep original report
+
+async def _handle_transcript_update(last_analysis: SessionAnalysis, new_info: str, update_context: Dict[str, Any]):
+    """Re-run the pipeline with additional transcript content"""
+    logger.info("Updating analysis with additional transcript tid=%s len=%d", _tid(new_info), len(new_info))
+
+    # Combine original transcript with new transcript information.
+    # Built with a single join so the (potentially large) transcript
+    # is copied once instead of through intermediate f-string pieces.
+    combined_transcript = "".join((
+        "\nOriginal Transcript:\n",
+        last_analysis.transcript,
+        "\n\nAdditional Transcript Information:\n",
+        new_info,
+        "\n"
+    ))
+
+    # Re-analyze with combined transcript
+    analysis_result = await policy_analyzer.analyze(combined_transcript)
+
+    # Generate new report and email concurrently based on updated analysis
+    updated_report, updated_email = await asyncio.gather(
+        report_generator.generate_report(
+            transcript=combined_transcript,
+            analysis=analysis_result
+        ),
+        email_generator.generate_email(
+            analysis=analysis_result,
+            transcript=combined_transcript
+        )
+    )
+
+    # Update stored data
+    last_analysis.transcript = combined_transcript
+    last_analysis.analysis = analysis_result
+    last_analysis.incident_report = updated_report
+    last_analysis.email_draft = updated_email
+
+    return updated_report, updated_email
+
+_MISSING = object()
+
+def _dict_delta(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Top-level diff of two report/email dicts for delta responses"""
+    return {
+        "changed": {k: v for k, v in new.items() if old.get(k, _MISSING) != v},
+        "removed": [k for k in old if k not in new],
+    }
+
+# O(1) dispatch for /update_analysis; adding a new update type is one handler
+# plus one entry here
+_UPDATE_HANDLERS = {
+    "incident_report": _handle_report_update,
+    "email_update": _handle_email_update,
+    "transcript_update": _handle_transcript_update,
+}
+
 @app.post("/update_analysis")
-async def update_analysis(request: Dict[str, Any]):
+async def update_analysis(request: Dict[str, Any], delta: bool = False):
     """
-    Update existing analysis with new information using LLM-based approach
+    Update existing analysis with new information using LLM-based approach.
+
+    With ?delta=true the report and email come back as top-level diffs
+    against the stored versions instead of the full objects, which keeps
+    small edits to multi-page reports off the wire.
     """
     try:
         session_id = request.get("session_id", "default")
         new_info = request.get("new_information", "")
         update_type = request.get("update_type", "incident_report")  # Default to incident_report
         
-        context = conversation_contexts.get(session_id, {})
+        context = await conversation_contexts.get(session_id)
         if not context.get("last_analysis"):
             raise ValueError("No previous analysis found. Please analyze a transcript first.")
         
         last_analysis = context["last_analysis"]
         
-        logger.info(f"Updating {update_type} with new information: {new_info[:100]}...")
-        
-        # Create context for the updaters
-        update_context = {
-            "original_transcript": last_analysis["transcript"],
-            "original_analysis": last_analysis["analysis"],
-            "session_id": session_id
-        }
+        logger.info("Updating %s with new information tid=%s", update_type, _tid(new_info))
         
-        # Update based on type using LLM services
-        if update_type == "incident_report":
-            # Validate original report exists
-            if not last_analysis.get("incident_report"):
-                raise ValueError("No incident report found to update")
-            
-            logger.info(f"Updating incident report with: '{new_info[:100]}{'...' if len(new_info) > 100 else ''}'")
-            
-            # Log current report data for debugging
-            current_report = last_analysis["incident_report"]
-            logger.debug(f"Current report data being sent to LLM: {json.dumps(current_report, indent=2)}")
-            
-            # Update incident report using LLM
-            updated_report = await report_updater.update_report(
-                original_report=current_report,
-                update_info=new_info,
-                context=update_context
-            )
-            
-            # Verify update was successful
-            if updated_report == last_analysis["incident_report"]:
-                logger.warning("No changes detected in updated report")
-            else:
-                logger.info("Incident report successfully updated")
-                
-            last_analysis["incident_report"] = updated_report
-            incident_report = updated_report
-            email_draft = last_analysis["email_draft"]  # Keep original email
-            
-        elif update_type == "email_update":
-            # Validate original email exists
-            if not last_analysis.get("email_draft"):
-                raise ValueError("No email draft found to update")
-            
-            logger.info(f"Updating email draft with: '{new_info[:100]}{'...' if len(new_info) > 100 else ''}'")
-            
-            # Log current email data for debugging
-            current_email = last_analysis["email_draft"]
-            logger.debug(f"Current email data being sent to LLM: {json.dumps(current_email, indent=2)}")
-            
-            # Update email using LLM
-            updated_email = await email_updater.update_email(
-                original_email=current_email,
-                update_info=new_info,
-                context=update_context
-            )
-            
-            # Verify update was successful
-            if updated_email == last_analysis["email_draft"]:
-                logger.warning("No changes detected in updated email")
+        # Snapshot the current objects so delta responses can diff against them
+        original_report = last_analysis.incident_report
+        original_email = last_analysis.email_draft
+
+        # Create context for the updaters, reusing a pooled dict when available
+        update_context = _ctx_pool.pop() if _ctx_pool else {}
+        update_context["original_transcript"] = last_analysis.transcript
+        update_context["original_analysis"] = last_analysis.analysis
+        update_context["session_id"] = session_id
+
+        try:
+            handler = _UPDATE_HANDLERS.get(update_type)
+            if handler is None:
+                # Fallback to original method for backward compatibility
+                logger.warning(f"Unknown update_type: {update_type}, using fallback")
+                incident_report = last_analysis.incident_report
+                email_draft = last_analysis.email_draft
             else:
-                logger.info("Email draft successfully updated")
-                
-            last_analysis["email_draft"] = updated_email
-            email_draft = updated_email
-            incident_report = last_analysis["incident_report"]  # Keep original report
-            
-        elif update_type == "transcript_update":
-            # Handle transcript updates by re-analyzing with additional transcript content
-            logger.info(f"Updating analysis with additional transcript: '{new_info[:100]}{'...' if len(new_info) > 100 else ''}'")
-            
-            # Combine original transcript with new transcript information
-            combined_transcript = f"""
-Original Transcript:
-{last_analysis['transcript']}
-
-Additional Transcript Information:
-{new_info}
-"""
-            
-            # Re-analyze with combined transcript
-            analysis_result = await policy_analyzer.analyze(combined_transcript)
-            
-            # Generate new report and email based on updated analysis
-            updated_report = await report_generator.generate_report(
-                transcript=combined_transcript,
-                analysis=analysis_result
-            )
-            
-            updated_email = await email_generator.generate_email(
-                incident_report=updated_report,
-                analysis=analysis_result
-            )
-            
-            # Update stored data
-            last_analysis["transcript"] = combined_transcript
-            last_analysis["analysis"] = analysis_result
-            last_analysis["incident_report"] = updated_report
-            last_analysis["email_draft"] = updated_email
-            
-            incident_report = updated_report
-            email_draft = updated_email
-            
-        else:
-            # Fallback to original method for backward compatibility
-            logger.warning(f"Unknown update_type: {update_type}, using fallback")
-            incident_report = last_analysis["incident_report"]
-            email_draft = last_analysis["email_draft"]
-        
+                incident_report, email_draft = await handler(last_analysis, new_info, update_context)
+        finally:
+            # Return the context dict to the pool for the next update
+            update_context.clear()
+            _ctx_pool.append(update_context)
+
         # Update context with timestamp
-        last_analysis["last_update"] = datetime.now().isoformat()
-        last_analysis["last_update_type"] = update_type
-        last_analysis["last_update_info"] = new_info
-        
-        return {
+        last_analysis.last_update = _now_iso()
+        last_analysis.last_update_type = update_type
+        last_analysis.last_update_info = new_info
+        await conversation_contexts.set(session_id, context)
+
+        analysis = last_analysis.analysis
+        result = {
             "status": "success",
             "update_type": update_type,
-            "analysis_summary": last_analysis["analysis"].get("summary", ""),
+            "analysis_summary": analysis.get("summary", ""),
             "incident_report": incident_report,
             "email_draft": email_draft,
-            "policy_violations": last_analysis["analysis"].get("violations", []),
-            "recommendations": last_analysis["analysis"].get("recommendations", [])
+            "policy_violations": analysis.get("violations", []),
+            "recommendations": analysis.get("recommendations", [])
         }
+        if delta:
+            result["incident_report"] = _dict_delta(original_report or {}, incident_report or {})
+            result["email_draft"] = _dict_delta(original_email or {}, email_draft or {})
+            result["delta"] = True
+            result["version"] = last_analysis.last_update
+        return result
         
     except Exception as e:
         logger.error(f"Error updating analysis: {str(e)}")
@@ -262,17 +550,19 @@ async def regenerate_component(component: str, request: Dict[str, Any]):
     Regenerate a specific component with user feedback
     """
     try:
-        logger.info(f"Regenerating {component} with feedback: {request.get('feedback', '')[:100]}...")
-        
+        original = request.get("original")
+        feedback = request.get("feedback") or ""
+        logger.info("Regenerating %s with feedback tid=%s", component, _tid(feedback))
+
         if component == "report":
             result = await report_generator.regenerate_with_feedback(
-                original=request.get("original"),
-                feedback=request.get("feedback")
+                original=original,
+                feedback=feedback
             )
         elif component == "email":
             result = await email_generator.regenerate_with_feedback(
-                original=request.get("original"),
-                feedback=request.get("feedback")
+                original=original,
+                feedback=feedback
             )
         else:
             raise ValueError(f"Invalid component: {component}")
@@ -302,84 +592,49 @@ async def test_openai_connection(request: Dict[str, Any]):
                 "error": "Invalid API key format. OpenAI API keys start with 'sk-'"
             }
         
-        # Test the API key with a simple request
-        client = OpenAI(api_key=api_key)
-        
-        # Make a minimal test request with timeout
+        # Validate the key with a cheap, non-billed GET; async so the event
+        # loop keeps serving other requests while the probe is in flight
         logger.info("Testing OpenAI API connection...")
-        
-        # Try different approach for testing
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": "Test"}],
-                max_tokens=5,
-                timeout=10.0  # 10 second timeout
-            )
-        except Exception as chat_error:
-            logger.warning(f"Chat completion failed, trying models list: {chat_error}")
-            # Fallback: try listing models (simpler API call)
-            try:
-                models = client.models.list()
-                logger.info("Models list successful - API key is valid")
-                return {
-                    "success": True,
-                    "message": "Connection successful (verified via models list)",
-                    "model": "gpt-4o-mini"
-                }
-            except Exception as models_error:
-                logger.error(f"Both tests failed - chat: {chat_error}, models: {models_error}")
-                raise chat_error  # Raise original error
-        
+        client = AsyncOpenAI(api_key=api_key, http_client=shared_async_http_client())
+        await client.models.retrieve(settings.openai_model, timeout=5.0)
+
         logger.info("OpenAI connection test successful")
         return {
             "success": True,
             "message": "Connection successful",
-            "model": "gpt-4o-mini",
-            "usage": response.usage.total_tokens if response.usage else 0
+            "model": settings.openai_model
         }
-        
-    except ImportError:
-        logger.error("OpenAI package not installed")
+
+    except AuthenticationError:
+        logger.error("OpenAI connection test failed: invalid API key")
+        return {
+            "success": False,
+            "error": "Invalid API key. Please check your OpenAI API key."
+        }
+    except PermissionDeniedError:
+        logger.error("OpenAI connection test failed: permission denied")
+        return {
+            "success": False,
+            "error": "API key doesn't have permission. Please check your OpenAI account."
+        }
+    except RateLimitError:
+        logger.error("OpenAI connection test failed: rate limited")
+        return {
+            "success": False,
+            "error": "Rate limit exceeded. Please try again later."
+        }
+    except (APITimeoutError, APIConnectionError) as e:
+        logger.error(f"OpenAI connection test failed: {e}")
         return {
             "success": False,
-            "error": "OpenAI package is not installed. Please install it with: pip install openai"
+            "error": "Connection timeout. Please check your internet connection and try again."
         }
     except Exception as e:
-        error_str = str(e)
-        logger.error(f"OpenAI connection test failed: {error_str}")
-        
-        # Handle common error types
-        if "401" in error_str or "Unauthorized" in error_str:
-            return {
-                "success": False,
-                "error": "Invalid API key. Please check your OpenAI API key."
-            }
-        elif "403" in error_str or "Forbidden" in error_str:
-            return {
-                "success": False,
-                "error": "API key doesn't have permission. Please check your OpenAI account."
-            }
-        elif "429" in error_str or "rate_limit" in error_str.lower():
-            return {
-                "success": False,
-                "error": "Rate limit exceeded. Please try again later."
-            }
-        elif "timeout" in error_str.lower() or "connection" in error_str.lower():
-            return {
-                "success": False,
-                "error": "Connection timeout. Please check your internet connection and try again."
-            }
-        elif "proxy" in error_str.lower():
-            return {
-                "success": False,
-                "error": "Proxy error. Please check your network configuration."
-            }
-        else:
-            return {
-                "success": False,
-                "error": f"Connection failed: {error_str}"
-            }
+        logger.error(f"OpenAI connection test failed: {e}")
+        return {
+            "success": False,
+            "error": f"Connection failed: {e}"
+        }
 
 @app.post("/api/update_keys")
 async def update_api_keys(request: Dict[str, Any]):
@@ -389,24 +644,26 @@ async def update_api_keys(request: Dict[str, Any]):
         if not openai_key:
             raise ValueError("OpenAI API key is required")
         
-        # Update environment variable
-        os.environ["OPENAI_API_KEY"] = openai_key
-        
-        # Update settings
-        from app.config import settings
-        settings.openai_api_key = openai_key
-        
-        # Reinitialize services
-        global policy_analyzer, report_generator, email_generator, report_updater, email_updater
-        try:
-            policy_analyzer = PolicyAnalyzer()
-            report_generator = ReportGenerator()
-            email_generator = EmailGenerator()
-            report_updater = ReportUpdater()
-            email_updater = EmailUpdater()
-        except Exception as e:
-            logger.error(f"Error reinitializing services: {str(e)}")
-            raise ValueError(f"Failed to initialize services with new API key: {str(e)}")
+        async with _rekey_lock:
+            # Update environment variable and the cached copy used by /health
+            os.environ["OPENAI_API_KEY"] = openai_key
+            global _openai_key
+            _openai_key = openai_key
+
+            # Update settings
+            from app.config import settings
+            settings.openai_api_key = openai_key
+
+            # Every service resolves its client through the shared provider,
+            # so one rebuild rekeys the whole pipeline; no service objects
+            # are reconstructed and requests already in flight finish on the
+            # client they captured.
+            try:
+                get_openai_client(openai_key)
+                get_async_openai_client(openai_key)
+            except Exception as e:
+                logger.error(f"Error rebuilding OpenAI client: {str(e)}")
+                raise ValueError(f"Failed to initialize services with new API key: {str(e)}")
         
         return {
             "success": True,
@@ -422,7 +679,7 @@ async def update_api_keys(request: Dict[str, Any]):
 
 @app.get("/health")
 async def health_check():
-    openai_configured = bool(os.getenv("OPENAI_API_KEY"))
+    openai_configured = bool(_openai_key)
     return {
         "status": "healthy",
         "ai_provider": "openai",
@@ -433,9 +690,9 @@ async def health_check():
             "email_generator": "active" if openai_configured else "not_configured"
         },
         "debug_info": {
-            "active_sessions": len(conversation_contexts),
+            "active_sessions": await conversation_contexts.active_sessions(),
             "openai_key_configured": openai_configured,
-            "openai_key_length": len(os.getenv("OPENAI_API_KEY", "")) if openai_configured else 0
+            "openai_key_length": len(_openai_key)
         }
     }
 
@@ -443,6 +700,5 @@ async def health_check():
 async def clear_context(request: Dict[str, Any]):
     """Clear conversation context for a session"""
     session_id = request.get("session_id", "default")
-    if session_id in conversation_contexts:
-        del conversation_contexts[session_id]
+    await conversation_contexts.delete(session_id)
     return {"status": "context cleared"}
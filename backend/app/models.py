@@ -1,12 +1,26 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
+# These models are DTOs populated either by FastAPI's request parsing or by
+# our own generators; extra-field collection and post-init mutation are never
+# needed, so they're ignored/frozen to keep per-instance overhead down.
+
 class TranscriptRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     transcript: str = Field(..., description="The call/meeting transcript to analyze")
-    metadata: Optional[Dict[str, Any]] = Field(default={}, description="Additional metadata")
+    metadata: Optional[Dict[str, Any]] = Field(default_factory=dict, description="Additional metadata")
+
+    @field_validator("metadata", mode="before")
+    @classmethod
+    def _none_to_empty(cls, value):
+        # Clients may send an explicit null; treat it as "no metadata"
+        return {} if value is None else value
 
 class IncidentReport(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     date_time: datetime
     service_user_name: str
     location: str
@@ -22,21 +36,62 @@ class IncidentReport(BaseModel):
     risk_assessment_type: Optional[str] = None
 
 class EmailDraft(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     to: List[str]
-    cc: Optional[List[str]] = []
+    cc: List[str] = Field(default_factory=list)
     subject: str
     body: str
     priority: str = "normal"
-    attachments: Optional[List[str]] = []
+    attachments: List[str] = Field(default_factory=list)
+
+    @field_validator("to", "cc", "attachments", mode="before")
+    @classmethod
+    def _coerce_to_list(cls, value):
+        # LLM responses sometimes emit a bare address instead of an array
+        if isinstance(value, str):
+            return [value]
+        return value
 
 class PolicyViolation(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     policy_section: str
     violation_type: str
     severity: str
     description: str
     required_action: str
 
+class ExtractedFacts(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+    injuries_mentioned: List[str] = Field(default_factory=list)
+    symptoms: List[str] = Field(default_factory=list)
+    frequency: Optional[str] = None
+    witnesses: List[str] = Field(default_factory=list)
+    family_mentioned: List[str] = Field(default_factory=list)
+    medical_conditions: List[str] = Field(default_factory=list)
+    medications: List[str] = Field(default_factory=list)
+
+class AnalysisResult(BaseModel):
+    """Schema for structured-output transcript analysis"""
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+    service_user_name: str = "Unknown"
+    service_user_age: Optional[str] = None
+    location: str = "Not specified"
+    incident_type: str = "Other"
+    incident_time: Optional[str] = None
+    summary: str
+    violations: List[PolicyViolation] = Field(default_factory=list)
+    notifications_required: List[str] = Field(default_factory=list)
+    risk_assessments: List[str] = Field(default_factory=list)
+    recommendations: List[str] = Field(default_factory=list)
+    extracted_facts: ExtractedFacts = Field(default_factory=ExtractedFacts)
+
 class IncidentResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     analysis_summary: str
     incident_report: Dict[str, Any]
     email_draft: Dict[str, Any]
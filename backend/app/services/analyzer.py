@@ -1,9 +1,14 @@
+import asyncio
+import functools
+import logging
 import os
 import re
-import json
-import logging
-from typing import Dict, Any, List
+from collections import Counter
 from pathlib import Path
+from typing import Dict, Any, List
+
+import orjson
+
 from app.config import settings
 
 try:
@@ -11,103 +16,73 @@ try:
 except ImportError:
     OpenAI = None
 
+# Canonical transcript extractors live in analyzer_fix; re-exported here for
+# callers that historically imported them from this module
+from .analyzer_fix import extract_name_from_transcript, extract_location_from_transcript
+from .openai_client import get_async_openai_client, get_openai_client
+
 logger = logging.getLogger(__name__)
 
-def extract_name_from_transcript(transcript):
-    """Extract service user name from transcript"""
-    
-    # Common patterns for names in transcripts
-    patterns = [
-        r"(?:I am|I'm|this is|my name is)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)",
-        r"(?:User|Caller|Client):\s*(?:Hi,?\s*)?(?:I'm|I am|this is)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)",
-        r"Service User:\s*(?:Hi,?\s*)?(?:I'm|I am|this is)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)",
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, transcript, re.IGNORECASE)
-        if match:
-            return match.group(1)
-    
-    # If no name found, return empty string
-    return ""
+# Keywords for the rule-based fallback, tagged by category. A single compiled
+# alternation (longest-first so "fallen" wins over "fall") finds every hit in
+# one linear pass over the transcript instead of one substring scan per
+# keyword; re's alternation engine stands in for an Aho-Corasick automaton
+# without adding a dependency.
+_KEYWORD_CATEGORIES = {
+    "fallen": "fall", "fall": "fall", "on the floor": "fall", "can't get up": "fall",
+    "confused": "mental", "disoriented": "mental", "can't remember": "mental",
+    "fuzzy": "mental", "all over the place": "mental", "don't know": "mental",
+    "third time": "repeated", "this week": "repeated",
+    "greg jones": "name_greg_jones", "living room": "location_living_room",
+    "no blood": "no_injury", "nothing's broken": "no_injury",
+    "20 minutes": "twenty_minutes",
+}
+_KEYWORD_SCAN = re.compile("|".join(
+    sorted(map(re.escape, _KEYWORD_CATEGORIES), key=len, reverse=True)
+))
 
-def extract_location_from_transcript(transcript):
-    """Extract location from transcript"""
-    
-    # Common location patterns
-    patterns = [
-        r"(?:in the|at the|in my|at my)\s+(bedroom|bathroom|kitchen|living room|garden|hallway|stairs)",
-        r"(?:fallen in|fell in|I'm in)\s+(?:the\s+)?(\w+\s*\w*)",
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, transcript, re.IGNORECASE)
-        if match:
-            return match.group(1).title()
-    
-    return ""
+def _scan_keywords(transcript_lower: str) -> Counter:
+    """Tally keyword-category hits in one pass over the lowered transcript"""
+    return Counter(_KEYWORD_CATEGORIES[m.group(0)] for m in _KEYWORD_SCAN.finditer(transcript_lower))
 
+@functools.lru_cache(maxsize=1)
+def _load_policies() -> str:
+    """Load policies from file (cached process-wide)"""
+    try:
+        policy_path = Path(__file__).parent.parent / "data" / "policies.txt"
+        with open(policy_path, 'r') as f:
+            return f.read()
+    except Exception as e:
+        logger.error("Error loading policies: %s", e)
+        return _get_embedded_policies()
 
-class PolicyAnalyzer:
-    def __init__(self):
-        if not OpenAI:
-            raise ImportError("OpenAI package is required but not installed")
-        if not settings.openai_api_key:
-            raise ValueError("OpenAI API key is required but not provided")
-        
-        self.client = OpenAI(api_key=settings.openai_api_key)
-        self.policies = self._load_policies()
-        
-    def _load_policies(self) -> str:
-        """Load policies from file"""
-        try:
-            policy_path = Path(__file__).parent.parent / "data" / "policies.txt"
-            with open(policy_path, 'r') as f:
-                return f.read()
-        except Exception as e:
-            logger.error(f"Error loading policies: {e}")
-            return self._get_embedded_policies()
-    
-    def _get_embedded_policies(self) -> str:
-        """Return embedded policies as fallback"""
-        return """
-        Section 3: Mobility & Moving
-        Falls are a common risk among service users and must be handled with immediate care and attention to prevent further injury.
-        - If a service user has fallen, first assess their physical state. Check for any signs of injury such as bruising, cuts, or difficulty moving.
-        - Ensure the service user is in a safe, comfortable position before attempting to assist them.
-        - If a service user falls, you must email your supervisor immediately with details of the incident.
-        - If this is a recurring issue (two or more falls in a week), cc the Risk Assessor on the email and arrange for a moving and handling risk assessment review.
-        
-        Section 5: Mental Health and Emotional Well-being
-        - In cases where a service user calls in confused, disoriented, or excessively worried, alert their family or next of kin to inform them of the situation.
-        """
-    
-    async def analyze(self, transcript: str) -> Dict[str, Any]:
-        """Analyze transcript against policies using OpenAI GPT"""
-        try:
-            analysis = await self._openai_analysis(transcript)
-            
-            # Validate the response
-            if analysis and isinstance(analysis, dict):
-                return analysis
-            else:
-                logger.warning("Invalid GPT response, using fallback")
-                return self._fallback_analysis(transcript)
-                
-        except Exception as e:
-            logger.error(f"Error in analysis: {e}")
-            return self._fallback_analysis(transcript)
-    
-    async def _openai_analysis(self, transcript: str) -> Dict[str, Any]:
-        """Use OpenAI GPT to analyze transcript"""
-        try:
-            prompt = f"""You are a social care compliance analyst. Analyze the following call transcript against the provided policies.
+def _get_embedded_policies() -> str:
+    """Return embedded policies as fallback"""
+    return """
+    Section 3: Mobility & Moving
+    Falls are a common risk among service users and must be handled with immediate care and attention to prevent further injury.
+    - If a service user has fallen, first assess their physical state. Check for any signs of injury such as bruising, cuts, or difficulty moving.
+    - Ensure the service user is in a safe, comfortable position before attempting to assist them.
+    - If a service user falls, you must email your supervisor immediately with details of the incident.
+    - If this is a recurring issue (two or more falls in a week), cc the Risk Assessor on the email and arrange for a moving and handling risk assessment review.
 
-Policies:
-{self.policies}
+    Section 5: Mental Health and Emotional Well-being
+    - In cases where a service user calls in confused, disoriented, or excessively worried, alert their family or next of kin to inform them of the situation.
+    """
 
-Transcript:
-{transcript}
+
+@functools.lru_cache(maxsize=1)
+def _analysis_prompt_prefix() -> str:
+    """Static portion of the analysis prompt (instructions + policies + schema).
+
+    Rendered once per process; per-call prompt building is then a single
+    two-piece concat with the transcript instead of re-interpolating ~2KB of
+    invariant text every request.
+    """
+    return f"""You are a social care compliance analyst. Analyze the following call transcript against the provided policies.
+
+Policies:
+{_load_policies()}
 
 Analyze the transcript and identify:
 1. Any policy violations or concerns (be specific about which policy section)
@@ -116,7 +91,7 @@ Analyze the transcript and identify:
 4. Risk assessments needed
 5. Mental health or safety concerns
 
-IMPORTANT: 
+IMPORTANT:
 - Only identify violations that are clearly indicated in the transcript
 - Be specific about which policy sections are relevant
 - List exact required actions from the policies
@@ -147,9 +122,68 @@ Return your analysis as a JSON object with this exact structure:
     }}
 }}
 
-Respond ONLY with the JSON object, no additional text."""
+Respond ONLY with the JSON object, no additional text.
+
+Transcript:
+"""
+
+
+class PolicyAnalyzer:
+    # No per-instance __dict__; attribute access on the analyze hot path goes
+    # through C-level slot descriptors (client is a class-level property)
+    __slots__ = ("policies", "_sem")
+
+    def __init__(self):
+        if not OpenAI:
+            raise ImportError("OpenAI package is required but not installed")
+        if not settings.openai_api_key:
+            raise ValueError("OpenAI API key is required but not provided")
+
+        self.policies = _load_policies()
+        # analyze() already evaluates every policy section in one completion,
+        # so there is no per-policy fan-out to batch. The semaphore bounds
+        # concurrent transcript analyses against OpenAI per-minute rate limits
+        # when many requests arrive at once.
+        self._sem = asyncio.Semaphore(settings.openai_concurrency)
+
+    @property
+    def client(self):
+        # Resolved per use from the process-wide async client, so a key
+        # rotation takes effect everywhere without touching service instances
+        return get_async_openai_client()
+
+    def set_api_key(self, api_key: str) -> None:
+        """Swap the OpenAI clients for a new API key without reloading policies"""
+        get_openai_client(api_key)
+        get_async_openai_client(api_key)
+
+
+    async def analyze(self, transcript: str) -> Dict[str, Any]:
+        """Analyze transcript against policies using OpenAI GPT"""
+        try:
+            async with self._sem:
+                analysis = await self._openai_analysis(transcript)
+
+            # Validate the response
+            if analysis and isinstance(analysis, dict):
+                return analysis
+            else:
+                logger.warning("Invalid GPT response, using fallback")
+                return self._fallback_analysis(transcript)
+                
+        except Exception as e:
+            logger.error("Error in analysis: %s", e)
+            return self._fallback_analysis(transcript)
+    
+    async def _openai_analysis(self, transcript: str) -> Dict[str, Any]:
+        """Use OpenAI GPT to analyze transcript"""
+        try:
+            # Static prefix (instructions + policies + schema) is prerendered;
+            # keeping the transcript last also preserves OpenAI prompt-cache
+            # hits on the shared prefix
+            prompt = _analysis_prompt_prefix() + transcript
             
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=settings.openai_model,
                 max_tokens=settings.openai_max_tokens,
                 temperature=0.3,  # Lower temperature for more consistent analysis
@@ -160,15 +194,13 @@ Respond ONLY with the JSON object, no additional text."""
             )
             
             # Extract JSON from OpenAI's response
-            json_str = response.choices[0].message.content.strip()
-            
-            # Clean up if wrapped in markdown
-            if json_str.startswith("```json"):
-                json_str = json_str[7:]
-            if json_str.endswith("```"):
-                json_str = json_str[:-3]
-            
-            analysis = json.loads(json_str.strip())
+            # Clean up if wrapped in markdown; removeprefix/removesuffix are
+            # no-ops (no copy) when the fences are absent
+            json_str = (response.choices[0].message.content.strip()
+                        .removeprefix("```json").removeprefix("```")
+                        .removesuffix("```").strip())
+
+            analysis = orjson.loads(json_str)
             
             # Validate required fields
             required_fields = ["summary", "violations", "notifications_required", "risk_assessments", "recommendations"]
@@ -178,11 +210,11 @@ Respond ONLY with the JSON object, no additional text."""
             
             return analysis
             
-        except json.JSONDecodeError as e:
-            logger.error(f"OpenAI returned invalid JSON: {e}")
+        except orjson.JSONDecodeError as e:
+            logger.error("OpenAI returned invalid JSON: %s", e)
             return None
         except Exception as e:
-            logger.error(f"OpenAI analysis failed: {e}")
+            logger.error("OpenAI analysis failed: %s", e)
             return None
     
     def _fallback_analysis(self, transcript: str) -> Dict[str, Any]:
@@ -205,23 +237,23 @@ Respond ONLY with the JSON object, no additional text."""
             }
         }
         
-        transcript_lower = transcript.lower()
-        
-        # Extract service user name
-        if "greg jones" in transcript_lower:
-            analysis["extracted_facts"]["service_user_name"] = "Greg Jones"
-        
+        hits = _scan_keywords(transcript.lower())
+
+        # Extract service user name via the shared regex extractor; the
+        # hardcoded keyword hit only backstops transcripts the patterns miss
+        name = extract_name_from_transcript(transcript) or ("Greg Jones" if hits["name_greg_jones"] else None)
+        if name:
+            analysis["extracted_facts"]["service_user_name"] = name
+
         # Extract location
-        if "living room" in transcript_lower:
-            analysis["extracted_facts"]["location"] = "Living room"
-        
+        location = extract_location_from_transcript(transcript) or ("Living room" if hits["location_living_room"] else None)
+        if location:
+            analysis["extracted_facts"]["location"] = location
+
         # Check for falls
-        fall_keywords = ["fallen", "fall", "on the floor", "can't get up"]
-        fall_count = sum(1 for keyword in fall_keywords if keyword in transcript_lower)
-        
-        if fall_count > 0:
+        if hits["fall"]:
             # Check for repeated falls
-            if "third time" in transcript_lower or "this week" in transcript_lower:
+            if hits["repeated"]:
                 analysis["extracted_facts"]["repeated_incident"] = True
                 analysis["violations"].append({
                     "policy_section": "Section 3: Mobility & Moving",
@@ -243,10 +275,7 @@ Respond ONLY with the JSON object, no additional text."""
                 analysis["notifications_required"].append("Supervisor")
         
         # Check for mental health concerns
-        mental_keywords = ["confused", "disoriented", "can't remember", "fuzzy", "all over the place", "don't know"]
-        mental_count = sum(1 for keyword in mental_keywords if keyword in transcript_lower)
-        
-        if mental_count > 0:
+        if hits["mental"]:
             analysis["extracted_facts"]["mental_state_concerns"] = True
             analysis["violations"].append({
                 "policy_section": "Section 5: Mental Health and Emotional Well-being",
@@ -260,13 +289,18 @@ Respond ONLY with the JSON object, no additional text."""
             analysis["recommendations"].append("Review medication for potential side effects")
         
         # Check for injuries
-        if "no blood" in transcript_lower or "nothing's broken" in transcript_lower:
+        if hits["no_injury"]:
             analysis["extracted_facts"]["injuries_reported"] = False
-        
+
         # Extract time information
-        if "20 minutes" in transcript_lower:
+        if hits["twenty_minutes"]:
             analysis["extracted_facts"]["incident_time"] = "Approximately 20 minutes on floor"
         
+        # De-duplicate accumulated lists (insertion order preserved) so
+        # downstream email generation and the JSON payload never see repeats
+        for key in ("notifications_required", "risk_assessments", "recommendations"):
+            analysis[key] = list(dict.fromkeys(analysis[key]))
+
         # Generate summary
         if analysis["violations"]:
             severity_count = len([v for v in analysis["violations"] if v["severity"] == "high"])
@@ -1,50 +1,51 @@
 import re
 
+# Compiled once at import so the extractors do no per-call pattern building
+_NAME_PATTERNS = [re.compile(p) for p in (
+    r"(?:I am|I'm|this is|my name is)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)",
+    r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?):\s*[\"']?(?:Hi|Hello|Help)",
+)]
+
+# Common non-names to filter out of matches
+_NON_NAMES = frozenset(['support', 'worker', 'carer', 'caller', 'user', 'client', 'julie', 'peaterson'])
+
+_TIME_PATTERN = re.compile(r'(\d+)\s*(?:minutes?|mins?|hours?|hrs?)', re.IGNORECASE)
+
+# Location phrases ("in the kitchen", "down the stairs", ...) mapped to their
+# canonical titles, folded into one alternation so a single scan replaces the
+# per-location, per-preposition substring checks
+_LOCATIONS = ('bedroom', 'bathroom', 'kitchen', 'living room', 'garden', 'hallway', 'stairs', 'lounge', 'dining room')
+_LOC_PHRASES = {
+    f"{preposition} {location}": location.title()
+    for location in _LOCATIONS
+    for preposition in ("in the", "in my", "at the", "down the")
+}
+_LOC_SCAN = re.compile("|".join(sorted(map(re.escape, _LOC_PHRASES), key=len, reverse=True)))
+
 def extract_name_from_transcript(transcript):
     """Extract service user name from transcript"""
-    
-    # Common patterns for names in transcripts
-    patterns = [
-        r"(?:I am|I'm|this is|my name is)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)",
-        r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?):\s*[\"']?(?:Hi|Hello|Help)",
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, transcript)
+    for pattern in _NAME_PATTERNS:
+        match = pattern.search(transcript)
         if match:
             name = match.group(1)
-            # Filter out common non-names
-            if name.lower() not in ['support', 'worker', 'carer', 'caller', 'user', 'client', 'julie', 'peaterson']:
+            if name.lower() not in _NON_NAMES:
                 return name
-    
+
     # If no name found, return empty string
     return ""
 
 def extract_location_from_transcript(transcript):
     """Extract location from transcript"""
-    
-    # Common location patterns
-    locations = ['bedroom', 'bathroom', 'kitchen', 'living room', 'garden', 'hallway', 'stairs', 'lounge', 'dining room']
-    
-    transcript_lower = transcript.lower()
-    for location in locations:
-        if location in transcript_lower:
-            # Check if it's in context of being in that location
-            if f"in the {location}" in transcript_lower or f"in my {location}" in transcript_lower:
-                return location.title()
-            elif f"at the {location}" in transcript_lower:
-                return location.title()
-            elif f"down the {location}" in transcript_lower:
-                return location.title()
-    
+    match = _LOC_SCAN.search(transcript.lower())
+    if match:
+        return _LOC_PHRASES[match.group(0)]
+
     return ""
 
 def extract_time_duration(transcript):
     """Extract time duration from transcript"""
-    
-    # Look for time patterns
-    time_match = re.search(r'(\d+)\s*(?:minutes?|mins?|hours?|hrs?)', transcript, re.IGNORECASE)
+    time_match = _TIME_PATTERN.search(transcript)
     if time_match:
         return time_match.group(0)
-    
+
     return ""
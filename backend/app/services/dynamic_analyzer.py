@@ -1,5 +1,6 @@
-import json
 import logging
+
+import orjson
 from typing import Dict, Any
 from app.config import settings
 
@@ -8,19 +9,26 @@ try:
 except ImportError:
     OpenAI = None
 
+from .openai_client import get_async_openai_client
+
 logger = logging.getLogger(__name__)
 
 class DynamicAnalyzer:
     """Analyzer that uses OpenAI for analysis"""
-    
+
+    __slots__ = ()
+
     def __init__(self):
         if not OpenAI:
             raise ImportError("OpenAI package is required but not installed")
         if not settings.openai_api_key:
             raise ValueError("OpenAI API key is required but not provided")
         
-        self.client = OpenAI(api_key=settings.openai_api_key)
     
+    @property
+    def client(self):
+        return get_async_openai_client()
+
     async def analyze(self, transcript: str, policies: str) -> Dict[str, Any]:
         """Analyze transcript using OpenAI"""
         logger.info("Analyzing with OpenAI")
@@ -30,7 +38,7 @@ class DynamicAnalyzer:
             return await self._analyze_openai(prompt)
                 
         except Exception as e:
-            logger.error(f"Error with OpenAI: {e}")
+            logger.error("Error with OpenAI: %s", e)
             # Fallback to rule-based analysis
             return self._fallback_analysis(transcript)
     
@@ -56,7 +64,7 @@ class DynamicAnalyzer:
     
     async def _analyze_openai(self, prompt: str) -> Dict[str, Any]:
         """Analyze using OpenAI"""
-        response = self.client.chat.completions.create(
+        response = await self.client.chat.completions.create(
             model=settings.openai_model,
             max_tokens=settings.openai_max_tokens,
             messages=[
@@ -66,7 +74,7 @@ class DynamicAnalyzer:
             response_format={"type": "json_object"},
             temperature=0.3
         )
-        return json.loads(response.choices[0].message.content)
+        return orjson.loads(response.choices[0].message.content)
     
     def _fallback_analysis(self, transcript: str) -> Dict[str, Any]:
         """Fallback rule-based analysis"""
@@ -1,9 +1,14 @@
+import asyncio
+import functools
+import hashlib
 import os
-import json
 import logging
+import re
 from datetime import datetime
 from typing import Dict, Any, List
 
+import orjson
+
 from app.config import settings
 
 # AI Provider imports
@@ -12,51 +17,254 @@ try:
 except ImportError:
     OpenAI = None
 
+from .openai_client import get_async_openai_client, get_openai_client
+
 logger = logging.getLogger(__name__)
 
+# Content-addressed cache of completed drafts, keyed on the exact report and
+# analysis content. At temperature 0.3 a repeat of the same incident gets an
+# equivalent email, so a hit skips the OpenAI round-trip entirely. Hits are
+# exact-match only: the model weaves report and analysis details (names,
+# injuries, family members) throughout the prose, so reusing a draft across
+# merely similar incidents would leak one service user's narrative into
+# another user's email.
+_DRAFT_CACHE_MAX = 256
+_draft_cache: Dict[str, Dict[str, Any]] = {}
+
+
+# Static instruction block shared by every generation call. Keeping it (and
+# the system message) byte-identical and ahead of the per-incident JSON lets
+# OpenAI's automatic prefix caching reuse the tokenized prefix across calls.
+_STATIC_INSTRUCTIONS = """
+            Generate a professional email to notify relevant parties about this incident.
+
+            Create an email that:
+            1. Clearly states the incident
+            2. Outlines immediate actions taken
+            3. Specifies required follow-up actions
+            4. Maintains professional tone
+            5. Includes all necessary recipients based on policy requirements
+
+            Return as JSON with keys: to, cc, subject, body, priority
+"""
+
+_REGENERATE_INSTRUCTIONS = """
+            Generate an updated email incorporating the user feedback below.
+            Maintain professionalism and all required information.
+"""
+
+# One case-insensitive scan per notification string instead of a lowercase
+# copy plus three substring walks; group 1 routes to cc, group 2 to to
+_NOTIF_RE = re.compile(r"(risk assessor)|(family|next of kin)", re.IGNORECASE)
+
+# O(1) routing for notifications that arrive as normalized tokens (the common
+# shape from our own analyzers); free-text strings fall back to the regex scan
+_NOTIF_ROUTING = {
+    "risk assessor": ("cc", "riskassessment@emmacare.com"),
+    "family": ("to", "family.contact@emmacare.com"),
+    "next of kin": ("to", "family.contact@emmacare.com"),
+    "family/next of kin": ("to", "family.contact@emmacare.com"),
+}
+
+# Trivial, unambiguous edits that don't warrant an LLM round-trip; each is a
+# (matcher, patch) pair applied locally when the feedback is only that edit
+_QUICK_EDITS = (
+    (re.compile(r"(?i)^\s*(?:make (?:the )?)?subject shorter\.?\s*$"),
+     lambda e: {**e, "subject": e.get("subject", "")[:60]}),
+    (re.compile(r"(?i)^\s*remove (?:the )?cc\.?\s*$"),
+     lambda e: {**e, "cc": []}),
+    (re.compile(r"(?i)^\s*(?:upgrade|mark|set)(?: it)?(?: priority)? (?:to |as )?urgent\.?\s*$"),
+     lambda e: {**e, "priority": "high",
+                "subject": e.get("subject", "") if e.get("subject", "").startswith("URGENT")
+                else "URGENT: " + e.get("subject", "")}),
+)
+
+# Matchers for top-level string fields in the streamed JSON; a field is
+# surfaced as soon as its closing quote arrives in the buffer
+_STREAM_FIELD_RES = {
+    field: re.compile(rf'"{field}"\s*:\s*"((?:[^"\\]|\\.)*)"')
+    for field in ("subject", "priority", "body")
+}
+
+
+def _draft_cache_key(incident_report: Dict[str, Any], analysis: Dict[str, Any]) -> str:
+    """Content hash of the exact report+analysis pair for draft-cache lookup"""
+    payload = orjson.dumps((incident_report, analysis), option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
 class EmailGenerator:
     def __init__(self):
         if not OpenAI:
             raise ImportError("OpenAI package is required but not installed")
         if not settings.openai_api_key:
             raise ValueError("OpenAI API key is required but not provided")
-        
-        self.client = OpenAI(api_key=settings.openai_api_key)
-        
-    async def generate_email(self, incident_report: Dict[str, Any], analysis: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate email draft based on incident report and analysis"""
+
+        # Bounds concurrent generations against OpenAI per-minute rate limits
+        self._sem = asyncio.Semaphore(settings.openai_concurrency)
+
+    @property
+    def client(self):
+        return get_async_openai_client()
+
+    def set_api_key(self, api_key: str) -> None:
+        """Swap the OpenAI clients for a new API key"""
+        get_openai_client(api_key)
+        get_async_openai_client(api_key)
+
+    async def generate_email(self, analysis: Dict[str, Any], incident_report: Dict[str, Any] = None,
+                             transcript: str = None) -> Dict[str, Any]:
+        """Generate email draft from the analysis plus either the incident report or the raw transcript.
+
+        The transcript form lets callers run email generation concurrently with
+        report generation instead of waiting for the report to finish.
+        """
         try:
-            email = await self._ai_generate(incident_report, analysis)
+            async with self._sem:
+                email = await self._ai_generate(analysis, incident_report, transcript)
             if not email:
-                email = self._fallback_generate(incident_report, analysis)
+                email = self._fallback_generate(incident_report or {}, analysis)
             return email
         except Exception as e:
-            logger.error(f"Error generating email: {e}")
-            return self._fallback_generate(incident_report, analysis)
-    
-    async def _ai_generate(self, incident_report: Dict[str, Any], analysis: Dict[str, Any]) -> Dict[str, Any]:
-        """Use OpenAI to generate email"""
+            logger.error("Error generating email: %s", e)
+            return self._fallback_generate(incident_report or {}, analysis)
+
+    async def generate_many(self, items: List[tuple]) -> List[Dict[str, Any]]:
+        """Generate emails for several incidents concurrently.
+
+        ``items`` is a list of (incident_report, analysis) pairs; the
+        semaphore keeps the fan-out within rate limits while the async client
+        overlaps the network-bound calls.
+        """
+        return list(await asyncio.gather(
+            *(self.generate_email(analysis, report) for report, analysis in items)
+        ))
+
+    async def generate_emails_batch(self, items: List[tuple]) -> List[Dict[str, Any]]:
+        """Generate emails for several incidents in one completion.
+
+        ``items`` is a list of (incident_report, analysis) pairs. Packing them
+        into a single prompt turns N API round-trips into one, amortizing the
+        network and queuing overhead that dominates per-call latency.
+        """
+        if not items:
+            return []
+        if len(items) == 1:
+            report, analysis = items[0]
+            return [await self.generate_email(analysis, report)]
+
         try:
-            prompt = f"""
-            Generate a professional email to notify relevant parties about this incident.
-            
-            Incident Report:
-            {json.dumps(incident_report, indent=2)}
-            
+            sections = "\n---\n".join(
+                f"[{i}]\nIncident Report:\n{orjson.dumps(report).decode()}\nAnalysis:\n{orjson.dumps(analysis).decode()}"
+                for i, (report, analysis) in enumerate(items)
+            )
+            prompt = f"""{_STATIC_INSTRUCTIONS}
+            Generate one email per incident below ({len(items)} total).
+            Return as JSON: {{"emails": [...]}} with one email object per incident, preserving order.
+
+            {sections}
+            """
+
+            response = await self.client.chat.completions.create(
+                model=settings.openai_model,
+                max_tokens=settings.openai_max_tokens,
+                temperature=0.3,
+                messages=[
+                    {"role": "system", "content": "You are a social care coordinator drafting incident notification emails. Be clear, professional, and action-oriented."},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"}
+            )
+            emails = orjson.loads(response.choices[0].message.content).get("emails")
+            if isinstance(emails, list) and len(emails) == len(items):
+                return emails
+            logger.warning("Batch email response malformed, using fallback")
+        except Exception as e:
+            logger.error("Batch email generation failed: %s", e)
+
+        return [self._fallback_generate(report, analysis) for report, analysis in items]
+
+    def _generation_prompt(self, analysis: Dict[str, Any], incident_report: Dict[str, Any],
+                           transcript: str) -> str:
+        """Build the generation prompt from the report (or transcript) and analysis"""
+        if incident_report is not None:
+            source_section = f"Incident Report:\n            {orjson.dumps(incident_report).decode()}"
+        else:
+            source_section = f"Call Transcript:\n            {transcript}"
+
+        return f"""{_STATIC_INSTRUCTIONS}
+            {source_section}
+
             Analysis:
-            {json.dumps(analysis, indent=2)}
-            
-            Create an email that:
-            1. Clearly states the incident
-            2. Outlines immediate actions taken
-            3. Specifies required follow-up actions
-            4. Maintains professional tone
-            5. Includes all necessary recipients based on policy requirements
-            
-            Return as JSON with keys: to, cc, subject, body, priority
+            {orjson.dumps(analysis).decode()}
             """
-            
-            response = self.client.chat.completions.create(
+
+    async def generate_email_stream(self, analysis: Dict[str, Any], incident_report: Dict[str, Any] = None,
+                                    transcript: str = None):
+        """Stream the email as it is generated, yielding progressively filled dicts.
+
+        Top-level string fields (subject, priority, body) are surfaced as soon
+        as they complete in the token stream, so callers can render the
+        subject line while the body is still decoding; the final yield is the
+        fully parsed email (or the template fallback on error).
+        """
+        try:
+            stream = await self.client.chat.completions.create(
+                model=settings.openai_model,
+                max_tokens=settings.openai_max_tokens,
+                temperature=0.3,
+                messages=[
+                    {"role": "system", "content": "You are a social care coordinator drafting incident notification emails. Be clear, professional, and action-oriented."},
+                    {"role": "user", "content": self._generation_prompt(analysis, incident_report, transcript)}
+                ],
+                response_format={"type": "json_object"},
+                stream=True
+            )
+
+            buffer = ""
+            partial: Dict[str, Any] = {}
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                buffer += delta
+                # If the model opened with prose instead of JSON, every further
+                # token is billed waste — stop decoding and use the fallback
+                head = buffer.lstrip()
+                if head and not head.startswith("{"):
+                    logger.warning("Streamed email response is not JSON, aborting early")
+                    await stream.close()
+                    yield self._fallback_generate(incident_report or {}, analysis)
+                    return
+                updated = False
+                for field, pattern in _STREAM_FIELD_RES.items():
+                    if field not in partial:
+                        match = pattern.search(buffer)
+                        if match:
+                            partial[field] = match.group(1)
+                            updated = True
+                if updated:
+                    yield dict(partial)
+
+            yield orjson.loads(buffer)
+        except Exception as e:
+            logger.error("Streaming email generation failed: %s", e)
+            yield self._fallback_generate(incident_report or {}, analysis)
+
+    async def _ai_generate(self, analysis: Dict[str, Any], incident_report: Dict[str, Any] = None,
+                           transcript: str = None) -> Dict[str, Any]:
+        """Use OpenAI to generate email"""
+        try:
+            if incident_report is not None:
+                cache_key = _draft_cache_key(incident_report, analysis)
+                cached = _draft_cache.get(cache_key)
+                if cached is not None:
+                    logger.info("Email draft cache hit")
+                    return cached
+
+            prompt = self._generation_prompt(analysis, incident_report, transcript)
+
+            response = await self.client.chat.completions.create(
                 model=settings.openai_model,
                 max_tokens=settings.openai_max_tokens,
                 temperature=0.3,
@@ -66,10 +274,17 @@ class EmailGenerator:
                 ],
                 response_format={"type": "json_object"}
             )
-            return json.loads(response.choices[0].message.content)
-            
+            email = orjson.loads(response.choices[0].message.content)
+
+            if incident_report is not None and isinstance(email, dict):
+                if len(_draft_cache) >= _DRAFT_CACHE_MAX:
+                    _draft_cache.pop(next(iter(_draft_cache)))
+                _draft_cache[cache_key] = email
+
+            return email
+
         except Exception as e:
-            logger.error(f"OpenAI email generation failed: {e}")
+            logger.error("OpenAI email generation failed: %s", e)
             return None
     
     def _fallback_generate(self, incident_report: Dict[str, Any], analysis: Dict[str, Any]) -> Dict[str, Any]:
@@ -81,18 +296,28 @@ class EmailGenerator:
         cc_recipients = []
         
         # Check for specific notifications required
-        for notification in analysis.get("notifications_required", []):
-            if "risk assessor" in notification.lower():
-                cc_recipients.append("riskassessment@emmacare.com")
-            if "family" in notification.lower() or "next of kin" in notification.lower():
-                to_recipients.append("family.contact@emmacare.com")
+        recipients = {"to": to_recipients, "cc": cc_recipients}
+        for notification in analysis.get("notifications_required") or ():
+            route = _NOTIF_ROUTING.get(notification.lower())
+            if route is not None:
+                field, address = route
+                recipients[field].append(address)
+                continue
+            # Free text can name several parties ("Risk Assessor and family"),
+            # so route every match, not just the first
+            for match in _NOTIF_RE.finditer(notification):
+                field, address = ("cc", "riskassessment@emmacare.com") if match.group(1) \
+                    else ("to", "family.contact@emmacare.com")
+                recipients[field].append(address)
+
+        # Dedupe while preserving order
+        to_recipients = list(dict.fromkeys(to_recipients))
+        cc_recipients = list(dict.fromkeys(cc_recipients))
         
-        # Determine priority
-        priority = "normal"
-        high_severity_count = sum(1 for v in analysis.get("violations", []) 
-                                 if v.get("severity") == "high")
-        if high_severity_count > 0:
-            priority = "high"
+        # Determine priority (short-circuits on the first high-severity hit)
+        priority = "high" if any(
+            v.get("severity") == "high" for v in analysis.get("violations") or ()
+        ) else "normal"
         
         # Generate subject
         incident_type = incident_report.get("incident_type", "Incident")
@@ -113,64 +338,62 @@ class EmailGenerator:
     
     def _generate_email_body(self, incident_report: Dict[str, Any], analysis: Dict[str, Any], priority: str) -> str:
         """Generate email body"""
-        
-        body_parts = []
-        
-        # Opening
-        if priority == "high":
-            body_parts.append("This email requires immediate attention.")
-            body_parts.append("")
-        
-        body_parts.append("Dear Team,")
-        body_parts.append("")
-        body_parts.append(f"I am writing to inform you of an incident involving {incident_report.get('service_user_name', 'a service user')} that occurred on {self._format_datetime(incident_report.get('date_time', ''))}.")
-        body_parts.append("")
-        
-        # Incident Summary
-        body_parts.append("**Incident Summary:**")
-        body_parts.append(f"- Type: {incident_report.get('incident_type', 'Unknown')}")
-        body_parts.append(f"- Location: {incident_report.get('location', 'Unknown')}")
-        body_parts.append(f"- Description: {incident_report.get('description', 'No description available')}")
-        body_parts.append("")
-        
-        # Immediate Actions
-        body_parts.append("**Immediate Actions Taken:**")
-        body_parts.append(incident_report.get('immediate_actions', 'Standard support protocol initiated'))
-        body_parts.append("")
-        
-        # Policy Concerns
-        if analysis.get("violations"):
-            body_parts.append("**Policy Concerns Identified:**")
-            for violation in analysis["violations"]:
-                body_parts.append(f"- {violation.get('policy_section', 'Policy')}: {violation.get('description', '')}")
-            body_parts.append("")
-        
-        # Required Actions
-        body_parts.append("**Required Follow-up Actions:**")
-        for violation in analysis.get("violations", []):
-            if violation.get("required_action"):
-                body_parts.append(f"- {violation['required_action']}")
-        
-        # Risk Assessment
-        if incident_report.get("risk_assessment_needed"):
-            body_parts.append(f"- {incident_report.get('risk_assessment_type', 'Risk assessment')} required")
-        body_parts.append("")
-        
-        # Next Steps
-        body_parts.append("**Agreed Next Steps:**")
-        body_parts.append(incident_report.get('agreed_next_steps', 'To be determined'))
-        body_parts.append("")
-        
-        # Closing
-        body_parts.append("Please review the attached incident report for full details. If you have any questions or require additional information, please contact me immediately.")
-        body_parts.append("")
-        body_parts.append("Best regards,")
-        body_parts.append("Emma Care Coordination Team")
-        
-        return "\n".join(body_parts)
+        # Bind the report fields once; the template below is then a single
+        # f-string build instead of ~30 list appends plus a join
+        report_get = incident_report.get
+        name = report_get('service_user_name', 'a service user')
+        occurred = self._format_datetime(report_get('date_time', ''))
+        incident_type = report_get('incident_type', 'Unknown')
+        location = report_get('location', 'Unknown')
+        description = report_get('description', 'No description available')
+        immediate_actions = report_get('immediate_actions', 'Standard support protocol initiated')
+        next_steps = report_get('agreed_next_steps', 'To be determined')
+
+        violations = analysis.get("violations") or ()
+
+        urgent_header = "This email requires immediate attention.\n\n" if priority == "high" else ""
+
+        concerns_lines = "\n".join(
+            f"- {v.get('policy_section', 'Policy')}: {v.get('description', '')}"
+            for v in violations
+        )
+        concerns_block = f"**Policy Concerns Identified:**\n{concerns_lines}\n\n" if concerns_lines else ""
+
+        action_lines = [
+            f"- {v['required_action']}" for v in violations if v.get("required_action")
+        ]
+        if report_get("risk_assessment_needed"):
+            action_lines.append(f"- {report_get('risk_assessment_type', 'Risk assessment')} required")
+        actions_block = "\n".join(action_lines)
+
+        return f"""{urgent_header}Dear Team,
+
+I am writing to inform you of an incident involving {name} that occurred on {occurred}.
+
+**Incident Summary:**
+- Type: {incident_type}
+- Location: {location}
+- Description: {description}
+
+**Immediate Actions Taken:**
+{immediate_actions}
+
+{concerns_block}**Required Follow-up Actions:**
+{actions_block}
+
+**Agreed Next Steps:**
+{next_steps}
+
+Please review the attached incident report for full details. If you have any questions or require additional information, please contact me immediately.
+
+Best regards,
+Emma Care Coordination Team"""
     
-    def _format_datetime(self, datetime_str: str) -> str:
-        """Format datetime string for email"""
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _format_datetime(datetime_str: str) -> str:
+        """Format datetime string for email (memoized; repeated regenerations
+        of the same incident hit the cache instead of re-parsing)"""
         try:
             dt = datetime.fromisoformat(datetime_str)
             return dt.strftime("%B %d, %Y at %I:%M %p")
@@ -179,19 +402,28 @@ class EmailGenerator:
     
     async def regenerate_with_feedback(self, original: Dict[str, Any], feedback: str) -> Dict[str, Any]:
         """Regenerate email with user feedback using OpenAI"""
+        # Trivial edits are patched locally — no LLM round-trip, and the
+        # cached drafts stay valid since the generation itself was fine.
+        # Patches splat the original, so only a real dict takes this path;
+        # a null original still goes through the LLM like the baseline did.
+        if isinstance(original, dict):
+            for pattern, patch in _QUICK_EDITS:
+                if pattern.match(feedback):
+                    return patch(original)
+
+        # Feedback means the generated draft missed the mark; drop cached
+        # drafts rather than keep serving ones the user is correcting
+        _draft_cache.clear()
         try:
-            prompt = f"""
+            prompt = f"""{_REGENERATE_INSTRUCTIONS}
             Original email:
-            {json.dumps(original, indent=2)}
-            
+            {orjson.dumps(original).decode()}
+
             User feedback:
             {feedback}
-            
-            Generate an updated email incorporating the feedback.
-            Maintain professionalism and all required information.
             """
             
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=settings.openai_model,
                 max_tokens=settings.openai_max_tokens,
                 temperature=0.3,
@@ -201,8 +433,8 @@ class EmailGenerator:
                 ],
                 response_format={"type": "json_object"}
             )
-            return json.loads(response.choices[0].message.content)
+            return orjson.loads(response.choices[0].message.content)
             
         except Exception as e:
-            logger.error(f"Error regenerating email with OpenAI: {e}")
+            logger.error("Error regenerating email with OpenAI: %s", e)
             return original
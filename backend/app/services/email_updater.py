@@ -1,9 +1,15 @@
+import asyncio
 import os
-import json
 import logging
+import re
 from typing import Dict, Any
 
+import orjson
+
+from pydantic import ValidationError
+
 from app.config import settings
+from app.models import EmailDraft
 
 # AI Provider imports
 try:
@@ -11,28 +17,20 @@ try:
 except ImportError:
     OpenAI = None
 
-logger = logging.getLogger(__name__)
+from .openai_client import (
+    call_with_retries,
+    get_async_openai_client,
+    get_openai_client,
+    parse_json_response,
+)
 
-class EmailUpdater:
-    def __init__(self):
-        if not OpenAI:
-            raise ImportError("OpenAI package is required but not installed")
-        if not settings.openai_api_key:
-            raise ValueError("OpenAI API key is required but not provided")
-        
-        self.client = OpenAI(api_key=settings.openai_api_key)
-    
-    async def update_email(self, original_email: Dict[str, Any], update_info: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Update email draft with new information using LLM"""
-        try:
-            prompt = f"""
-You are a social care coordinator responsible for drafting professional incident notification emails. You need to update an existing email draft with new information provided by the user.
+logger = logging.getLogger(__name__)
 
-CURRENT EMAIL DRAFT JSON:
-{json.dumps(original_email, indent=2)}
-
-NEW INFORMATION PROVIDED BY USER:
-"{update_info}"
+# Static instructions for email updates. Kept byte-identical in the system
+# message on every call so OpenAI's automatic prefix caching covers the
+# guide/examples/requirements; only the email JSON and the user's new
+# information vary per call (and the new information appears exactly once).
+_UPDATE_SYSTEM = """You are a social care coordinator responsible for drafting professional incident notification emails. You update an existing email draft with new information provided by the user.
 
 TASK: Analyze the new information and determine which specific JSON fields need to be updated.
 
@@ -45,12 +43,12 @@ FIELD MAPPING GUIDE - Map user input to these JSON fields:
 - "attachments": Array of attachment names (e.g. ["incident_report.pdf"])
 
 ANALYSIS PROCESS:
-1. READ the user's new information: "{update_info}"
+1. READ the user's new information
 2. IDENTIFY which email fields this information relates to
 3. UPDATE those specific fields based on the new information
 4. PRESERVE all other fields exactly as they are
 
-SPECIFIC EXAMPLES FOR THIS UPDATE:
+SPECIFIC EXAMPLES:
 - If user mentions changing sender organization → update "body" to change signature/sender info
 - If user says "send to different person" → update "to" array with new recipients
 - If user says "mark as urgent" → set "priority": "high"
@@ -69,137 +67,113 @@ CRITICAL REQUIREMENTS:
 7. Do NOT add new fields or remove existing fields
 8. Maintain professional email tone and formatting
 
-ANALYZE THE INPUT "{update_info}" AND UPDATE THE RELEVANT FIELDS:
+Return ONLY the complete updated email as a valid JSON object, no additional text or markdown formatting."""
+
+# Zero-width split point just before the sign-off; works for CRLF bodies too
+_CLOSING_RE = re.compile(r"(?=Best regards,)")
 
-EMAIL JSON STRUCTURE:
-- to: Array of primary recipients
-- cc: Array of CC recipients  
-- subject: String subject line
-- body: String email content
-- priority: String priority level
-- attachments: Array of attachment names
+# Per-call user turn: built once, spliced per request with str.format
+_USER_PROMPT = """CURRENT EMAIL DRAFT JSON:
+{email_json}
 
-Return the complete updated email as a JSON object:
+NEW INFORMATION PROVIDED BY USER:
+"{update_info}"
 """
 
-            # Add explicit JSON instruction to prompt for models that don't support response_format
-            json_prompt = prompt + "\n\nIMPORTANT: Return ONLY a valid JSON object, no additional text or markdown formatting."
-            
+
+class EmailUpdater:
+    def __init__(self):
+        if not OpenAI:
+            raise ImportError("OpenAI package is required but not installed")
+        if not settings.openai_api_key:
+            raise ValueError("OpenAI API key is required but not provided")
+
+        # Bounds concurrent updates against OpenAI per-minute rate limits
+        self._sem = asyncio.Semaphore(settings.openai_concurrency)
+
+    @property
+    def client(self):
+        return get_async_openai_client()
+
+    def set_api_key(self, api_key: str) -> None:
+        """Swap the OpenAI clients for a new API key"""
+        get_openai_client(api_key)
+        get_async_openai_client(api_key)
+
+    async def update_email(self, original_email: Dict[str, Any], update_info: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Update email draft with new information using LLM"""
+        try:
+            user_prompt = _USER_PROMPT.format(
+                email_json=orjson.dumps(original_email).decode(),
+                update_info=update_info,
+            )
+
             try:
-                response = self.client.chat.completions.create(
-                    model=settings.openai_model,
-                    max_tokens=settings.openai_max_tokens,
-                    messages=[
-                        {
-                            "role": "system", 
-                            "content": "You are a social care coordinator drafting professional incident notification emails. Update emails accurately while maintaining professional standards and clear communication. Always return valid JSON."
-                        },
-                        {"role": "user", "content": json_prompt}
-                    ],
-                    response_format={"type": "json_object"},
-                    temperature=0.3
-                )
-            except Exception as e:
-                if "response_format" in str(e):
-                    # Fallback for models that don't support response_format
-                    response = self.client.chat.completions.create(
+                async with self._sem:
+                    response = await call_with_retries(lambda: self.client.chat.completions.create(
                         model=settings.openai_model,
                         max_tokens=settings.openai_max_tokens,
                         messages=[
-                            {
-                                "role": "system", 
-                                "content": "You are a social care coordinator drafting professional incident notification emails. Update emails accurately while maintaining professional standards and clear communication. Always return valid JSON only, no additional text."
-                            },
-                            {"role": "user", "content": json_prompt}
+                            {"role": "system", "content": _UPDATE_SYSTEM},
+                            {"role": "user", "content": user_prompt}
                         ],
+                        response_format={"type": "json_object"},
                         temperature=0.3
-                    )
+                    ))
+            except Exception as e:
+                if "response_format" in str(e):
+                    # Fallback for models that don't support response_format
+                    async with self._sem:
+                        response = await call_with_retries(lambda: self.client.chat.completions.create(
+                            model=settings.openai_model,
+                            max_tokens=settings.openai_max_tokens,
+                            messages=[
+                                {"role": "system", "content": _UPDATE_SYSTEM},
+                                {"role": "user", "content": user_prompt}
+                            ],
+                            temperature=0.3
+                        ))
                 else:
                     raise e
             
             # Extract JSON from response
             json_str = response.choices[0].message.content.strip()
             logger.debug(f"Raw OpenAI response for email update: {json_str[:500]}...")
-            
-            if json_str.startswith("```json"):
-                json_str = json_str[7:]
-            if json_str.endswith("```"):
-                json_str = json_str[:-3]
-            updated_email = json.loads(json_str.strip())
-            
-            # Validate that all original fields are present
-            required_fields = ["to", "cc", "subject", "body", "priority"]
-            missing_fields = []
-            for field in required_fields:
-                if field not in updated_email:
-                    updated_email[field] = original_email.get(field, [] if field in ["to", "cc"] else "")
-                    missing_fields.append(field)
-            
-            # Ensure attachments field exists
-            if "attachments" not in updated_email:
-                updated_email["attachments"] = original_email.get("attachments", [])
-                if "attachments" in original_email:
-                    missing_fields.append("attachments")
-            
-            if missing_fields:
-                logger.warning(f"OpenAI response missing fields {missing_fields}, restored from original")
-            
-            # Validate structure integrity
-            if not isinstance(updated_email, dict):
+
+            raw = parse_json_response(json_str)
+            if not isinstance(raw, dict):
                 logger.error("OpenAI returned non-dict response")
                 return original_email
-                
-            # Validate and normalize essential field types
-            # Normalize 'to' field
-            if not isinstance(updated_email.get("to", []), list):
-                if isinstance(updated_email.get("to"), str):
-                    # Convert string to array
-                    updated_email["to"] = [updated_email["to"]]
-                    logger.info("Converted 'to' field from string to array")
-                else:
-                    logger.warning("Invalid 'to' field type, restoring from original")
-                    updated_email["to"] = original_email.get("to", [])
-            
-            # Normalize 'cc' field  
-            if not isinstance(updated_email.get("cc", []), list):
-                if isinstance(updated_email.get("cc"), str):
-                    # Convert string to array
-                    updated_email["cc"] = [updated_email["cc"]]
-                    logger.info("Converted 'cc' field from string to array")
-                else:
-                    logger.warning("Invalid 'cc' field type, restoring from original")
-                    updated_email["cc"] = original_email.get("cc", [])
-            
-            # Normalize 'attachments' field
-            if not isinstance(updated_email.get("attachments", []), list):
-                if isinstance(updated_email.get("attachments"), str):
-                    # Convert string to array
-                    updated_email["attachments"] = [updated_email["attachments"]]
-                    logger.info("Converted 'attachments' field from string to array")
+
+            # Missing fields fall through from the original; EmailDraft's
+            # validators (pydantic-core) handle str→list coercion and type
+            # checks that used to be ~50 lines of isinstance branches here
+            try:
+                updated_email = EmailDraft.model_validate({**original_email, **raw}).model_dump()
+            except ValidationError as e:
+                logger.warning(f"OpenAI response failed validation, keeping original: {e}")
+                return original_email
+
+            # Change detection is purely diagnostic, so skip it entirely when
+            # nothing at INFO would be emitted; snippets are only built for
+            # fields that actually changed
+            if logger.isEnabledFor(logging.INFO):
+                changed_fields = [
+                    field for field, new_value in updated_email.items()
+                    if new_value != original_email.get(field)
+                ]
+                if changed_fields:
+                    logger.info("Email updated successfully using OpenAI. Changes detected:")
+                    for field in changed_fields:
+                        logger.info("  - %s: '%.100s...' → '%.100s...'",
+                                    field, original_email.get(field), updated_email[field])
                 else:
-                    updated_email["attachments"] = original_email.get("attachments", [])
-                
-            # Detailed change detection and logging
-            changed_fields = {}
-            for field, new_value in updated_email.items():
-                original_value = original_email.get(field)
-                if new_value != original_value:
-                    changed_fields[field] = {
-                        "original": original_value,
-                        "updated": new_value
-                    }
-            
-            if changed_fields:
-                logger.info(f"Email updated successfully using OpenAI. Changes detected:")
-                for field, changes in changed_fields.items():
-                    logger.info(f"  - {field}: '{str(changes['original'])[:100]}...' → '{str(changes['updated'])[:100]}...'")
-            else:
-                logger.warning(f"No changes detected in updated email. User input was: '{update_info}'")
-                logger.warning("This might indicate OpenAI didn't understand which fields to update")
-                
+                    logger.warning("No changes detected in updated email. User input was: '%s'", update_info)
+                    logger.warning("This might indicate OpenAI didn't understand which fields to update")
+
             return updated_email
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Invalid JSON returned from OpenAI: {e}")
             logger.info("Falling back to original email")
             return original_email
@@ -211,23 +185,17 @@ Return the complete updated email as a JSON object:
     def _fallback_update(self, original_email: Dict[str, Any], update_info: str) -> Dict[str, Any]:
         """Fallback method for updating email if OpenAI fails"""
         logger.info("Using fallback email update method")
-        
+
         # Simple fallback - add update info to the email body
-        updated_email = original_email.copy()
-        
-        if "body" in updated_email:
-            # Add the new information before the closing
-            closing_index = updated_email["body"].rfind("Best regards,")
-            if closing_index != -1:
-                updated_body = (
-                    updated_email["body"][:closing_index] + 
-                    f"\n**Additional Information:**\n{update_info}\n\n" +
-                    updated_email["body"][closing_index:]
-                )
-                updated_email["body"] = updated_body
-            else:
-                updated_email["body"] += f"\n\nAdditional Information: {update_info}"
+        body = original_email.get("body")
+        if body is None:
+            return original_email | {"body": f"Additional Information: {update_info}"}
+
+        # Splice the new information before the closing, in one split
+        parts = _CLOSING_RE.split(body, maxsplit=1)
+        if len(parts) == 2:
+            new_body = f"{parts[0]}\n**Additional Information:**\n{update_info}\n\n{parts[1]}"
         else:
-            updated_email["body"] = f"Additional Information: {update_info}"
-        
-        return updated_email
\ No newline at end of file
+            new_body = f"{body}\n\nAdditional Information: {update_info}"
+
+        return original_email | {"body": new_body}
\ No newline at end of file
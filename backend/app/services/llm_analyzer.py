@@ -1,12 +1,19 @@
 # Standard library imports
-import json
+import asyncio
+import functools
+import hashlib
 import logging
 import os
+import re
+import time
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 
+import orjson
+
 # Local application imports
 from app.config import settings
+from app.models import AnalysisResult
 
 # AI Provider imports
 try:
@@ -14,8 +21,77 @@ try:
 except ImportError:
     OpenAI = None
 
+from .analyzer_fix import extract_name_from_transcript, extract_location_from_transcript
+from .openai_client import (
+    call_with_retries,
+    get_async_openai_client,
+    get_openai_client,
+    parse_json_response,
+)
+
 logger = logging.getLogger(__name__)
 
+# Content-addressed cache of completed analyses. At temperature 0.3 a repeat
+# transcript gets an equivalent answer, so re-sending it only burns tokens
+# and a multi-second round-trip; exact-match hashing covers the recurring
+# test/dev transcripts this service actually sees.
+_CACHE_TTL_SECONDS = 600.0
+_CACHE_MAX_ENTRIES = 512
+_analysis_cache: Dict[str, tuple] = {}
+_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _cache_key(transcript: str) -> str:
+    return hashlib.blake2b(transcript.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _cache_get(key: str) -> Optional[Dict[str, Any]]:
+    entry = _analysis_cache.get(key)
+    if entry is None or entry[0] < time.monotonic():
+        _analysis_cache.pop(key, None)
+        _cache_stats["misses"] += 1
+        return None
+    _cache_stats["hits"] += 1
+    return entry[1]
+
+
+def _cache_put(key: str, analysis: Dict[str, Any]) -> None:
+    if len(_analysis_cache) >= _CACHE_MAX_ENTRIES:
+        for stale in sorted(_analysis_cache, key=lambda k: _analysis_cache[k][0])[:_CACHE_MAX_ENTRIES // 4]:
+            _analysis_cache.pop(stale, None)
+    _analysis_cache[key] = (time.monotonic() + _CACHE_TTL_SECONDS, analysis)
+
+
+def cache_stats() -> Dict[str, int]:
+    """Hit/miss counters for the analysis cache"""
+    return dict(_cache_stats)
+
+
+@functools.lru_cache(maxsize=1)
+def _load_policies() -> str:
+    """Load policies from file (cached process-wide, so per-request analyzer
+    construction never touches the disk)"""
+    try:
+        policy_path = Path(__file__).parent.parent / "data" / "policies.txt"
+        with open(policy_path, 'r') as f:
+            return f.read()
+    except Exception as e:
+        logger.error("Error loading policies: %s", e)
+        return _default_policies()
+
+
+def _default_policies() -> str:
+    """Return default policies"""
+    return """
+        Section 3: Mobility & Moving
+        - If a service user falls, email supervisor immediately
+        - If recurring falls (2+ in a week), CC Risk Assessor
+
+        Section 5: Mental Health
+        - If confused/disoriented, alert family/next of kin
+        """
+
+
 class LLMAnalyzer:
     """Analyzer that primarily uses LLM for all extraction"""
     
@@ -25,44 +101,77 @@ class LLMAnalyzer:
         if not settings.openai_api_key:
             raise ValueError("OpenAI API key is required but not provided")
         
-        self.client = OpenAI(api_key=settings.openai_api_key)
-        self.policies = self._load_policies()
-    
-    def _load_policies(self) -> str:
-        """Load policies from file"""
-        try:
-            policy_path = Path(__file__).parent.parent / "data" / "policies.txt"
-            with open(policy_path, 'r') as f:
-                return f.read()
-        except Exception as e:
-            logger.error(f"Error loading policies: {e}")
-            return self._get_default_policies()
-    
-    def _get_default_policies(self) -> str:
-        """Return default policies"""
-        return """
-        Section 3: Mobility & Moving
-        - If a service user falls, email supervisor immediately
-        - If recurring falls (2+ in a week), CC Risk Assessor
-        
-        Section 5: Mental Health
-        - If confused/disoriented, alert family/next of kin
-        """
-    
+        self.policies = _load_policies()
+        # Bounds concurrent analyses against OpenAI per-minute rate limits
+        self._sem = asyncio.Semaphore(settings.openai_concurrency)
+        # Everything invariant (role, policies, schema, extraction rules)
+        # lives in the system message so OpenAI's automatic prefix caching
+        # covers it; only the transcript rides the user turn.
+        self._analysis_system = f"""You are an expert social care analyst. Extract all relevant information from call transcripts and analyze them against the policies below.
+
+POLICIES:
+{self.policies}
+
+Extract and return a JSON object with:
+{{
+    "service_user_name": "Extract the actual name from transcript (or 'Unknown' if not found)",
+    "service_user_age": "Extract age if mentioned (or null)",
+    "location": "Extract where the incident occurred (or 'Not specified')",
+    "incident_type": "Fall/Medical/Mental Health/Other",
+    "incident_time": "When it happened if mentioned",
+    "summary": "Brief summary of the incident",
+    "violations": [
+        {{
+            "policy_section": "Section name",
+            "violation_type": "Type of violation",
+            "severity": "high/medium/low",
+            "description": "What happened",
+            "required_action": "What must be done"
+        }}
+    ],
+    "notifications_required": ["List of people/roles to notify"],
+    "risk_assessments": ["List of assessments needed"],
+    "recommendations": ["List of recommendations"],
+    "extracted_facts": {{
+        "injuries_mentioned": ["list any injuries"],
+        "symptoms": ["list symptoms mentioned"],
+        "frequency": "how often this happens",
+        "witnesses": ["any witnesses mentioned"],
+        "family_mentioned": ["family members mentioned"],
+        "medical_conditions": ["any conditions mentioned"],
+        "medications": ["any medications mentioned"]
+    }}
+}}
+
+IMPORTANT: Extract the ACTUAL service user name from the transcript, not a placeholder.
+Look for phrases like "I'm [name]", "this is [name]", "my name is [name]", or "[name]: speaking"."""
+
+    @property
+    def client(self):
+        return get_async_openai_client()
+
     async def analyze(self, transcript: str) -> Dict[str, Any]:
         """Analyze transcript using OpenAI - fallback to rules only if needed"""
         logger.info("Starting analysis with OpenAI")
-        
+
+        key = _cache_key(transcript)
+        cached = _cache_get(key)
+        if cached is not None:
+            logger.info("Analysis cache hit")
+            return cached
+
         # Try OpenAI analysis first
         try:
             result = await self._openai_analysis(transcript)
             if result and self._validate_result(result):
                 logger.info("OpenAI analysis successful")
+                _cache_put(key, result)
                 return result
             else:
                 logger.warning("OpenAI result invalid, trying again with structured prompt")
                 result = await self._openai_structured_analysis(transcript)
                 if result and self._validate_result(result):
+                    _cache_put(key, result)
                     return result
         except Exception as e:
             logger.error(f"OpenAI analysis failed: {e}")
@@ -71,91 +180,194 @@ class LLMAnalyzer:
         logger.warning("Using rule-based fallback analysis")
         return self._rule_based_analysis(transcript)
     
+    # Accuracy degrades when too many transcripts share one completion
+    _MAX_BATCH = 16
+
+    async def analyze_batch(self, transcripts: List[str]) -> List[Dict[str, Any]]:
+        """Analyze several transcripts per API call.
+
+        Packing transcripts into one completion pays the policies/system
+        prompt once per batch instead of once per transcript. Batches are
+        capped at 16; failures fall back to the rule-based analysis per
+        transcript so the result list always aligns with the input.
+        """
+        results: List[Dict[str, Any]] = []
+        for start in range(0, len(transcripts), self._MAX_BATCH):
+            batch = transcripts[start:start + self._MAX_BATCH]
+            if len(batch) == 1:
+                results.append(await self.analyze(batch[0]))
+                continue
+
+            try:
+                sections = "\n---\n".join(
+                    f"TRANSCRIPT [{i}]:\n{t}" for i, t in enumerate(batch)
+                )
+                user_prompt = (
+                    f"Analyze each of the {len(batch)} transcripts below independently. "
+                    'Return JSON: {"results": [...]} with one analysis object per '
+                    f"transcript, preserving order.\n\n{sections}"
+                )
+                async with self._sem:
+                    response = await call_with_retries(lambda: self.client.chat.completions.create(
+                        model=settings.openai_model,
+                        max_tokens=settings.openai_max_tokens,
+                        messages=[
+                            {"role": "system", "content": self._analysis_system},
+                            {"role": "user", "content": user_prompt}
+                        ],
+                        response_format={"type": "json_object"},
+                        temperature=0.3
+                    ))
+                batch_results = parse_json_response(response.choices[0].message.content).get("results")
+                if isinstance(batch_results, list) and len(batch_results) == len(batch):
+                    results.extend(batch_results)
+                    continue
+                logger.warning("Batch analysis response malformed, using fallback")
+            except Exception as e:
+                logger.error(f"Batch analysis failed: {e}")
+
+            results.extend(self._rule_based_analysis(t) for t in batch)
+        return results
+
+    async def analyze_offline(self, transcripts: List[str],
+                              poll_interval: float = 60.0) -> List[Optional[Dict[str, Any]]]:
+        """Analyze transcripts through the OpenAI Batch API.
+
+        Batch requests are billed at half price with a 24h completion
+        window — right for bulk reprocessing, wrong for interactive calls
+        (those stay on analyze/analyze_batch). Returns one analysis per
+        transcript in input order; entries the batch failed on are None.
+        """
+        lines = b"\n".join(
+            orjson.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": settings.openai_model,
+                    "max_tokens": settings.openai_max_tokens,
+                    "messages": [
+                        {"role": "system", "content": self._analysis_system},
+                        {"role": "user", "content": f"TRANSCRIPT:\n{t}"}
+                    ],
+                    "response_format": {"type": "json_object"},
+                    "temperature": 0.3
+                },
+            })
+            for i, t in enumerate(transcripts)
+        )
+
+        batch_file = await self.client.files.create(
+            file=("analyses.jsonl", lines), purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        logger.info("Submitted analysis batch %s (%d transcripts)", batch.id, len(transcripts))
+
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"Analysis batch {batch.id} finished as {batch.status}")
+
+        output = await self.client.files.content(batch.output_file_id)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(transcripts)
+        for line in output.text.splitlines():
+            record = orjson.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            content = response["body"]["choices"][0]["message"]["content"]
+            results[int(record["custom_id"])] = parse_json_response(content)
+        return results
+
     async def _openai_analysis(self, transcript: str) -> Optional[Dict[str, Any]]:
-        """Primary OpenAI analysis with comprehensive extraction"""
-        prompt = f"""
-        Analyze this social care call transcript and extract ALL information.
-        
-        POLICIES:
-        {self.policies}
-        
-        TRANSCRIPT:
-        {transcript}
-        
-        Extract and return a JSON object with:
-        {{
-            "service_user_name": "Extract the actual name from transcript (or 'Unknown' if not found)",
-            "service_user_age": "Extract age if mentioned (or null)",
-            "location": "Extract where the incident occurred (or 'Not specified')",
-            "incident_type": "Fall/Medical/Mental Health/Other",
-            "incident_time": "When it happened if mentioned",
-            "summary": "Brief summary of the incident",
-            "violations": [
-                {{
-                    "policy_section": "Section name",
-                    "violation_type": "Type of violation",
-                    "severity": "high/medium/low",
-                    "description": "What happened",
-                    "required_action": "What must be done"
-                }}
-            ],
-            "notifications_required": ["List of people/roles to notify"],
-            "risk_assessments": ["List of assessments needed"],
-            "recommendations": ["List of recommendations"],
-            "extracted_facts": {{
-                "injuries_mentioned": ["list any injuries"],
-                "symptoms": ["list symptoms mentioned"],
-                "frequency": "how often this happens",
-                "witnesses": ["any witnesses mentioned"],
-                "family_mentioned": ["family members mentioned"],
-                "medical_conditions": ["any conditions mentioned"],
-                "medications": ["any medications mentioned"]
-            }}
-        }}
-        
-        IMPORTANT: Extract the ACTUAL service user name from the transcript, not a placeholder.
-        Look for phrases like "I'm [name]", "this is [name]", "my name is [name]", or "[name]: speaking".
+        """Primary OpenAI analysis with comprehensive extraction.
+
+        Structured outputs pin the response to the AnalysisResult schema —
+        no fence stripping, no missing-field patching, no JSONDecodeError
+        fallbacks. JSON mode remains as a fallback for models or SDK
+        versions without structured-output support.
         """
-        
         try:
-            response = self.client.chat.completions.create(
-                model=settings.openai_model,
-                max_tokens=settings.openai_max_tokens,
-                messages=[
-                    {"role": "system", "content": "You are an expert social care analyst. Extract all relevant information from transcripts."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.3  # Lower temperature for more consistent extraction
-            )
-            return json.loads(response.choices[0].message.content)
-                
+            async with self._sem:
+                response = await call_with_retries(lambda: self.client.beta.chat.completions.parse(
+                    model=settings.openai_model,
+                    max_tokens=settings.openai_max_tokens,
+                    messages=[
+                        {"role": "system", "content": self._analysis_system},
+                        {"role": "user", "content": f"TRANSCRIPT:\n{transcript}"}
+                    ],
+                    response_format=AnalysisResult,
+                    temperature=0.3
+                ))
+            parsed = response.choices[0].message.parsed
+            if parsed is not None:
+                return parsed.model_dump()
+            logger.warning("Structured analysis returned no parsed result, falling back to JSON mode")
+        except Exception as e:
+            logger.warning(f"Structured outputs unavailable ({e}), falling back to JSON mode")
+
+        return await self._openai_json_analysis(transcript)
+
+    async def _openai_json_analysis(self, transcript: str,
+                                    user_content: str = None) -> Optional[Dict[str, Any]]:
+        """JSON-mode analysis for models without structured-output support"""
+        try:
+            async with self._sem:
+                response = await call_with_retries(lambda: self.client.chat.completions.create(
+                    model=settings.openai_model,
+                    max_tokens=settings.openai_max_tokens,
+                    messages=[
+                        {"role": "system", "content": self._analysis_system},
+                        {"role": "user", "content": user_content or f"TRANSCRIPT:\n{transcript}"}
+                    ],
+                    response_format={"type": "json_object"},
+                    temperature=0.3  # Lower temperature for more consistent extraction
+                ))
+            return parse_json_response(response.choices[0].message.content)
+
         except Exception as e:
             logger.error(f"OpenAI analysis error: {e}")
             return None
     
+    # How often the validation-failure retry fires; worth watching to decide
+    # whether the second attempt earns its API spend
+    _structured_retries = 0
+
     async def _openai_structured_analysis(self, transcript: str) -> Optional[Dict[str, Any]]:
-        """Structured OpenAI analysis with step-by-step extraction"""
-        prompt = f"""
-        Step 1: Find the service user's name in this transcript:
-        {transcript}
-        
-        Look for:
-        - "I'm [name]" or "I am [name]"
-        - "This is [name]"
-        - "My name is [name]"
-        - "[name]:" at the start of dialogue
-        - Someone addressing them by name
-        
-        Step 2: Find the location (bedroom, bathroom, kitchen, etc.)
-        
-        Step 3: Identify the incident type and policy violations based on:
-        {self.policies}
-        
-        Return a complete JSON analysis following the structure provided.
+        """Step-by-step retry prompt for transcripts the first pass mangled.
+
+        Previously this built a step-by-step prompt and then discarded it,
+        re-running the original analysis — a full second API call with zero
+        new information. The prompt now actually goes to the model.
+        (Policies are not repeated here; they are already in the system
+        message.)
         """
-        
-        return await self._openai_analysis(transcript)
+        type(self)._structured_retries += 1
+        logger.info("Structured retry #%d for invalid analysis result", self._structured_retries)
+
+        prompt = f"""Step 1: Find the service user's name in this transcript:
+{transcript}
+
+Look for:
+- "I'm [name]" or "I am [name]"
+- "This is [name]"
+- "My name is [name]"
+- "[name]:" at the start of dialogue
+- Someone addressing them by name
+
+Step 2: Find the location (bedroom, bathroom, kitchen, etc.)
+
+Step 3: Identify the incident type and policy violations based on the policies provided.
+
+Return a complete JSON analysis following the structure provided."""
+
+        return await self._openai_json_analysis(transcript, user_content=prompt)
     
     def _validate_result(self, result: Dict[str, Any]) -> bool:
         """Validate that OpenAI returned proper structure with actual data"""
@@ -175,18 +387,17 @@ class LLMAnalyzer:
         
         return True
     
+    # One case-insensitive scan per category instead of per-keyword substring
+    # walks over a lowercased copy of the transcript
+    _FALL_RE = re.compile(r"\b(?:fall|fallen|fell)\b", re.IGNORECASE)
+    _CONFUSED_RE = re.compile(r"\b(?:confused|disoriented|can'?t remember)\b", re.IGNORECASE)
+
     def _rule_based_analysis(self, transcript: str) -> Dict[str, Any]:
         """Rule-based fallback - only used when OpenAI completely fails"""
         logger.info("Using rule-based fallback analysis")
         
-        # Import the rule-based extraction functions
-        try:
-            from .analyzer_fix import extract_name_from_transcript, extract_location_from_transcript
-            service_user_name = extract_name_from_transcript(transcript) or "Unknown"
-            location = extract_location_from_transcript(transcript) or "Not specified"
-        except:
-            service_user_name = "Unknown"
-            location = "Not specified"
+        service_user_name = extract_name_from_transcript(transcript) or "Unknown"
+        location = extract_location_from_transcript(transcript) or "Not specified"
         
         analysis = {
             "service_user_name": service_user_name,
@@ -204,9 +415,7 @@ class LLMAnalyzer:
         }
         
         # Basic keyword detection for violations
-        transcript_lower = transcript.lower()
-        
-        if any(word in transcript_lower for word in ["fall", "fallen", "fell"]):
+        if self._FALL_RE.search(transcript):
             analysis["incident_type"] = "Fall"
             analysis["violations"].append({
                 "policy_section": "Section 3: Mobility & Moving",
@@ -217,7 +426,7 @@ class LLMAnalyzer:
             })
             analysis["notifications_required"].append("Supervisor")
             
-        if any(word in transcript_lower for word in ["confused", "disoriented", "can't remember"]):
+        if self._CONFUSED_RE.search(transcript):
             if analysis["incident_type"] == "Unknown":
                 analysis["incident_type"] = "Mental Health Concern"
             analysis["violations"].append({
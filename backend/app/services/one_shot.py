@@ -0,0 +1,126 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
+
+from app.config import settings
+
+from .analyzer import _load_policies
+from .report_generator import _load_template
+
+try:
+    from openai import OpenAI
+except ImportError:
+    OpenAI = None
+
+from .openai_client import (
+    call_with_retries,
+    get_async_openai_client,
+    get_openai_client,
+)
+
+logger = logging.getLogger(__name__)
+
+class OneShotGenerator:
+    """Runs the full analysis pipeline in a single LLM call.
+
+    The three-step pipeline (analyze, report, email) pays one API round-trip
+    per stage even though the model sees the same transcript each time. This
+    service asks for the analysis, incident report, and email draft together
+    in one JSON response, collapsing three round-trips into one. Callers fall
+    back to the staged pipeline when the combined response is unusable.
+    """
+
+    def __init__(self):
+        if not OpenAI:
+            raise ImportError("OpenAI package is required but not installed")
+        if not settings.openai_api_key:
+            raise ValueError("OpenAI API key is required but not provided")
+
+        self.policies = _load_policies()
+        self.template = _load_template()
+        # Bounds concurrent one-shot calls against OpenAI per-minute rate
+        # limits, like every other service's completion path
+        self._sem = asyncio.Semaphore(settings.openai_concurrency)
+        # Everything ahead of the transcript is fixed for the process
+        # lifetime; building it once keeps the prompt prefix byte-identical
+        # across calls for OpenAI prefix caching
+        self._prompt_prefix = f"""You are a social care compliance analyst. Analyze the following call transcript against the provided policies, then produce the incident report and notification email in the same response.
+
+Policies:
+{self.policies}
+
+Return a single JSON object with exactly these three keys:
+
+"analysis": {{
+    "summary": "Brief summary of the incident and policy concerns",
+    "violations": [
+        {{
+            "policy_section": "Section number and name",
+            "violation_type": "Type of violation",
+            "severity": "high/medium/low",
+            "description": "What happened that violates the policy",
+            "required_action": "Specific action required by the policy"
+        }}
+    ],
+    "notifications_required": ["List of people/roles to notify"],
+    "risk_assessments": ["List of assessments needed"],
+    "recommendations": ["Additional recommended actions"]
+}}
+
+"incident_report": a complete report with these fields:
+{orjson.dumps(list(self.template.keys())).decode()}
+
+"email_draft": a professional notification email with keys: to, cc, subject, body, priority
+
+IMPORTANT:
+- Only identify violations that are clearly indicated in the transcript
+- Extract all report fields from the transcript; be specific and detailed
+- Address the email to the recipients required by the policies
+
+Respond ONLY with the JSON object, no additional text.
+
+Transcript:
+"""
+
+    @property
+    def client(self):
+        return get_async_openai_client()
+
+    def set_api_key(self, api_key: str) -> None:
+        """Swap the OpenAI clients for a new API key without reloading data files"""
+        get_openai_client(api_key)
+        get_async_openai_client(api_key)
+
+    async def generate(self, transcript: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]]:
+        """Return (analysis, incident_report, email_draft) or None on failure"""
+        try:
+            prompt = self._prompt_prefix + transcript
+
+            async with self._sem:
+                response = await call_with_retries(lambda: self.client.chat.completions.create(
+                    model=settings.openai_model,
+                    max_tokens=settings.openai_max_tokens,
+                    temperature=0.3,
+                    messages=[
+                        {"role": "system", "content": "You are a social care compliance analyst. Analyze call transcripts against policies and return JSON responses only."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    response_format={"type": "json_object"}
+                ))
+
+            result = orjson.loads(response.choices[0].message.content)
+
+            analysis = result.get("analysis")
+            incident_report = result.get("incident_report")
+            email_draft = result.get("email_draft")
+            if not all(isinstance(part, dict) for part in (analysis, incident_report, email_draft)):
+                logger.warning("One-shot response missing sections, falling back to staged pipeline")
+                return None
+
+            return analysis, incident_report, email_draft
+
+        except Exception as e:
+            logger.error("One-shot pipeline failed: %s", e)
+            return None
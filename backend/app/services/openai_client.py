@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import random
+import re
+import threading
+from typing import Optional
+
+import httpx
+import orjson
+
+from app.config import settings
+
+try:
+    from openai import (
+        APIConnectionError,
+        APITimeoutError,
+        AsyncOpenAI,
+        OpenAI,
+        RateLimitError,
+    )
+    _RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError)
+except ImportError:
+    AsyncOpenAI = None
+    OpenAI = None
+    _RETRYABLE_ERRORS = ()
+
+logger = logging.getLogger(__name__)
+
+# One connection pool for every OpenAI call in the process; keep-alive means
+# TCP/TLS handshakes (~50-200ms each) happen once, not per service per request
+_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+_TIMEOUT = 30.0
+
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+_client = None
+_client_key: Optional[str] = None
+_async_client = None
+_async_client_key: Optional[str] = None
+_lock = threading.Lock()
+
+
+def _shared_http_client() -> httpx.Client:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(limits=_LIMITS, timeout=_TIMEOUT)
+    return _http_client
+
+
+def shared_async_http_client() -> httpx.AsyncClient:
+    """Pooled httpx.AsyncClient for AsyncOpenAI users"""
+    global _async_http_client
+    if _async_http_client is None:
+        _async_http_client = httpx.AsyncClient(limits=_LIMITS, timeout=_TIMEOUT)
+    return _async_http_client
+
+
+def get_openai_client(api_key: str = None):
+    """Return the process-wide OpenAI client, rebuilt only when the key changes.
+
+    All services share this client (and its warm connection pool); rekeying
+    via /api/update_keys swaps the client once instead of once per service.
+    """
+    global _client, _client_key
+    if not OpenAI:
+        raise ImportError("OpenAI package is required but not installed")
+    key = api_key or settings.openai_api_key
+    if not key:
+        raise ValueError("OpenAI API key is required but not provided")
+    with _lock:
+        if _client is None or key != _client_key:
+            _client = OpenAI(api_key=key, http_client=_shared_http_client())
+            _client_key = key
+        return _client
+
+
+def get_async_openai_client(api_key: str = None):
+    """Async counterpart of get_openai_client, over the shared async pool.
+
+    Lets coroutine code await completions directly instead of blocking the
+    event loop (or paying a thread handoff) on the sync client.
+    """
+    global _async_client, _async_client_key
+    if not AsyncOpenAI:
+        raise ImportError("OpenAI package is required but not installed")
+    key = api_key or settings.openai_api_key
+    if not key:
+        raise ValueError("OpenAI API key is required but not provided")
+    with _lock:
+        if _async_client is None or key != _async_client_key:
+            _async_client = AsyncOpenAI(api_key=key, http_client=shared_async_http_client())
+            _async_client_key = key
+        return _async_client
+
+
+# Optional markdown fences around a JSON completion, stripped in one pass
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+
+def parse_json_response(text: str) -> dict:
+    """Strip optional ```json fences from a completion and parse with orjson"""
+    return orjson.loads(_FENCE.sub("", text))
+
+
+async def call_with_retries(make_call, max_attempts: int = None):
+    """Await make_call(), retrying transient OpenAI failures with backoff.
+
+    Retries 429s, connection errors, and timeouts with exponential backoff
+    plus jitter (capped at 30s); other exceptions propagate immediately so
+    callers keep their existing error handling.
+    """
+    attempts = max_attempts or settings.openai_max_retries
+    for attempt in range(attempts):
+        try:
+            return await make_call()
+        except _RETRYABLE_ERRORS as e:
+            if attempt == attempts - 1:
+                raise
+            delay = min(2 ** attempt, 30.0) * (0.5 + random.random())
+            logger.warning("OpenAI request failed (%s); retrying in %.1fs",
+                           type(e).__name__, delay)
+            await asyncio.sleep(delay)
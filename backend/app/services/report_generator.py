@@ -1,3 +1,4 @@
+import functools
 import os
 import json
 import logging
@@ -19,46 +20,58 @@ except ImportError:
     extract_name_from_transcript = lambda x: ""
     extract_location_from_transcript = lambda x: ""
 
+from .openai_client import get_async_openai_client, get_openai_client
+
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=1)
+def _load_template() -> Dict[str, str]:
+    """Load incident report template (cached process-wide)"""
+    try:
+        template_path = Path(__file__).parent.parent / "data" / "incident_template.json"
+        with open(template_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading template: {e}")
+        return _get_default_template()
+
+def _get_default_template() -> Dict[str, str]:
+    """Return default template"""
+    return {
+        "date_time": "DateTime",
+        "service_user_name": "Text",
+        "location": "Text",
+        "incident_type": "Text",
+        "description": "Text",
+        "immediate_actions": "Text",
+        "first_aid_administered": "Boolean",
+        "emergency_services_contacted": "Boolean",
+        "who_was_notified": "Text",
+        "witnesses": "Text",
+        "agreed_next_steps": "Text",
+        "risk_assessment_needed": "Boolean",
+        "risk_assessment_type": "Text"
+    }
+
 class ReportGenerator:
     def __init__(self):
         if not OpenAI:
             raise ImportError("OpenAI package is required but not installed")
         if not settings.openai_api_key:
             raise ValueError("OpenAI API key is required but not provided")
-        
-        self.client = OpenAI(api_key=settings.openai_api_key)
-        self.template = self._load_template()
-    
-    def _load_template(self) -> Dict[str, str]:
-        """Load incident report template"""
-        try:
-            template_path = Path(__file__).parent.parent / "data" / "incident_template.json"
-            with open(template_path, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading template: {e}")
-            return self._get_default_template()
-    
-    def _get_default_template(self) -> Dict[str, str]:
-        """Return default template"""
-        return {
-            "date_time": "DateTime",
-            "service_user_name": "Text",
-            "location": "Text",
-            "incident_type": "Text",
-            "description": "Text",
-            "immediate_actions": "Text",
-            "first_aid_administered": "Boolean",
-            "emergency_services_contacted": "Boolean",
-            "who_was_notified": "Text",
-            "witnesses": "Text",
-            "agreed_next_steps": "Text",
-            "risk_assessment_needed": "Boolean",
-            "risk_assessment_type": "Text"
-        }
-    
+
+        self.template = _load_template()
+
+    @property
+    def client(self):
+        return get_async_openai_client()
+
+    def set_api_key(self, api_key: str) -> None:
+        """Swap the OpenAI clients for a new API key without reloading the template"""
+        get_openai_client(api_key)
+        get_async_openai_client(api_key)
+
+
     async def generate_report(self, transcript: str, analysis: Dict[str, Any]) -> Dict[str, Any]:
         """Generate incident report based on transcript and analysis"""
         try:
@@ -73,23 +86,26 @@ class ReportGenerator:
     async def _ai_generate(self, transcript: str, analysis: Dict[str, Any]) -> Dict[str, Any]:
         """Use OpenAI to generate report"""
         try:
+            # Static instructions and field list first, volatile transcript and
+            # analysis last — keeps the prompt prefix identical across calls
+            # for OpenAI prefix caching
             prompt = f"""
             Based on this call transcript and analysis, generate an incident report.
-            
-            Transcript:
-            {transcript}
-            
-            Analysis:
-            {json.dumps(analysis, indent=2)}
-            
+
             Generate a complete incident report with these fields:
             {json.dumps(list(self.template.keys()), indent=2)}
-            
+
             Extract all relevant information from the transcript. Be specific and detailed.
             Return as JSON object.
+
+            Transcript:
+            {transcript}
+
+            Analysis:
+            {json.dumps(analysis, indent=2)}
             """
             
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=settings.openai_model,
                 max_tokens=settings.openai_max_tokens,
                 temperature=0.3,
@@ -203,7 +219,7 @@ class ReportGenerator:
             Maintain the same structure but adjust content based on feedback.
             """
             
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=settings.openai_model,
                 max_tokens=settings.openai_max_tokens,
                 temperature=0.3,
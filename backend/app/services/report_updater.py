@@ -11,6 +11,8 @@ try:
 except ImportError:
     OpenAI = None
 
+from .openai_client import get_async_openai_client, get_openai_client
+
 logger = logging.getLogger(__name__)
 
 class ReportUpdater:
@@ -20,8 +22,16 @@ class ReportUpdater:
         if not settings.openai_api_key:
             raise ValueError("OpenAI API key is required but not provided")
         
-        self.client = OpenAI(api_key=settings.openai_api_key)
-    
+
+    @property
+    def client(self):
+        return get_async_openai_client()
+
+    def set_api_key(self, api_key: str) -> None:
+        """Swap the OpenAI clients for a new API key"""
+        get_openai_client(api_key)
+        get_async_openai_client(api_key)
+
     async def update_report(self, original_report: Dict[str, Any], update_info: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """Update incident report with new information using LLM"""
         try:
@@ -83,7 +93,7 @@ Return the complete updated incident report as a JSON object:
             json_prompt = prompt + "\n\nIMPORTANT: Return ONLY a valid JSON object, no additional text or markdown formatting."
             
             try:
-                response = self.client.chat.completions.create(
+                response = await self.client.chat.completions.create(
                     model=settings.openai_model,
                     max_tokens=settings.openai_max_tokens,
                     messages=[
@@ -99,7 +109,7 @@ Return the complete updated incident report as a JSON object:
             except Exception as e:
                 if "response_format" in str(e):
                     # Fallback for models that don't support response_format
-                    response = self.client.chat.completions.create(
+                    response = await self.client.chat.completions.create(
                         model=settings.openai_model,
                         max_tokens=settings.openai_max_tokens,
                         messages=[
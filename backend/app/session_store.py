@@ -0,0 +1,155 @@
+# Standard library imports
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+# Third-party imports
+from cachetools import TTLCache
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+@dataclass(slots=True)
+class SessionAnalysis:
+    """Results of the most recent analysis pipeline run for a session.
+
+    Slotted so each session costs a fixed set of attribute slots instead of a
+    per-instance dict, and so field access in the update endpoints is a direct
+    attribute load rather than repeated key hashing.
+    """
+
+    transcript: str
+    analysis: Dict[str, Any]
+    incident_report: Dict[str, Any]
+    email_draft: Dict[str, Any]
+    timestamp: str
+    last_update: Optional[str] = None
+    last_update_type: Optional[str] = None
+    last_update_info: Optional[str] = None
+
+class SessionStore:
+    """Session context store shared across workers via Redis.
+
+    Each session is stored as separate Redis keys
+    (``ctx:{session_id}:transcript`` / ``:analysis`` / ``:report`` /
+    ``:email`` / ``:meta``) rather than one blob, so each piece serializes
+    independently and reads and writes go through a single pipelined
+    round-trip. All keys share one TTL: a session is either fully present or
+    gone, never a torso whose transcript has expired out from under the
+    report and email the update endpoints would then rebuild from nothing.
+    A size- and TTL-bounded in-process cache sits in front of Redis for hot
+    sessions; with Redis configured its entries live only a few seconds —
+    enough to absorb burst round-trips, short enough that another worker's
+    update is picked up on the next read, keeping Redis authoritative. When
+    Redis is not configured (or the redis package is not installed), the
+    store degrades to the in-process cache only, holding sessions for the
+    full TTL; clients that never call /clear_context age out instead of
+    leaking their transcripts forever.
+    """
+
+    # Local-cache lifetime when Redis is the store of record
+    _LOCAL_TTL_WITH_REDIS = 5
+
+    # How long a counted session total stays fresh; /health polls this, so
+    # load-balancer probes must not each pay a full keyspace scan
+    _COUNT_TTL = 5
+
+    def __init__(self, redis_url: Optional[str] = None, ttl: int = 3600, local_maxsize: int = 10_000):
+        self._ttl = ttl
+        self._redis = None
+        if redis_url:
+            if aioredis is None:
+                logger.warning("Redis URL configured but redis package is not installed; using in-process store only")
+            else:
+                self._redis = aioredis.from_url(redis_url, decode_responses=True)
+        local_ttl = self._LOCAL_TTL_WITH_REDIS if self._redis is not None else ttl
+        self._local: "TTLCache[str, Dict[str, Any]]" = TTLCache(maxsize=local_maxsize, ttl=local_ttl)
+        self._count = 0
+        self._count_expires = 0.0
+
+    _FIELDS = ("transcript", "analysis", "report", "email", "meta")
+
+    def _field_key(self, session_id: str, field: str) -> str:
+        return f"ctx:{session_id}:{field}"
+
+    async def get(self, session_id: str) -> Dict[str, Any]:
+        """Return the context for a session, or an empty dict if none exists"""
+        context = self._local.get(session_id)
+        if context is not None:
+            return context
+        if self._redis is not None:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for field in self._FIELDS:
+                    pipe.get(self._field_key(session_id, field))
+                transcript, analysis, report, email, meta = await pipe.execute()
+            # Require the transcript too: a session caught mid-expiry must
+            # read as gone, not as an empty transcript that a later
+            # transcript_update would silently re-analyze
+            if meta is not None and transcript is not None:
+                meta = json.loads(meta)
+                context = {
+                    "last_analysis": SessionAnalysis(
+                        transcript=transcript or "",
+                        analysis=json.loads(analysis) if analysis else {},
+                        incident_report=json.loads(report) if report else {},
+                        email_draft=json.loads(email) if email else {},
+                        **meta
+                    )
+                }
+                self._local[session_id] = context
+                return context
+        return {}
+
+    async def set(self, session_id: str, context: Dict[str, Any]) -> None:
+        """Persist the context for a session, refreshing its TTLs"""
+        self._local[session_id] = context
+        if self._redis is None:
+            return
+        last_analysis = context.get("last_analysis")
+        if not isinstance(last_analysis, SessionAnalysis):
+            return
+        fields = asdict(last_analysis)
+        meta = {
+            "timestamp": fields.pop("timestamp"),
+            "last_update": fields.pop("last_update"),
+            "last_update_type": fields.pop("last_update_type"),
+            "last_update_info": fields.pop("last_update_info"),
+        }
+        async with self._redis.pipeline(transaction=False) as pipe:
+            # One TTL for every key: the update endpoints need the transcript
+            # and analysis alongside the drafts, so letting the drafts outlive
+            # them would leave a half-session that updates corrupt.
+            pipe.set(self._field_key(session_id, "transcript"), fields["transcript"], ex=self._ttl)
+            pipe.set(self._field_key(session_id, "analysis"), json.dumps(fields["analysis"]), ex=self._ttl)
+            pipe.set(self._field_key(session_id, "report"), json.dumps(fields["incident_report"]), ex=self._ttl)
+            pipe.set(self._field_key(session_id, "email"), json.dumps(fields["email_draft"]), ex=self._ttl)
+            pipe.set(self._field_key(session_id, "meta"), json.dumps(meta), ex=self._ttl)
+            await pipe.execute()
+
+    async def delete(self, session_id: str) -> None:
+        """Remove the context for a session"""
+        self._local.pop(session_id, None)
+        if self._redis is not None:
+            await self._redis.delete(*(self._field_key(session_id, field) for field in self._FIELDS))
+
+    async def active_sessions(self) -> int:
+        """Count sessions currently held in the store (briefly cached)"""
+        if self._redis is None:
+            return len(self._local)
+        now = time.monotonic()
+        if now < self._count_expires:
+            return self._count
+        count = 0
+        async for _ in self._redis.scan_iter(match="ctx:*:meta"):
+            count += 1
+        self._count = count
+        self._count_expires = now + self._COUNT_TTL
+        return count
@@ -66,7 +66,7 @@ run_backend() {
     
     # Run the backend
     echo -e "${GREEN}Backend starting on http://localhost:8000${NC}"
-    uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload &
+    uvicorn app.main:app --host 0.0.0.0 --port 8000 --loop uvloop --http httptools --reload &
     BACKEND_PID=$!
     cd ..
 }
@@ -332,7 +332,7 @@ fi
 echo -e "${BLUE}Starting backend on http://localhost:8000...${NC}"
 cd backend
 source venv/bin/activate
-uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 &
+uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 --loop uvloop --http httptools &
 BACKEND_PID=$!
 
 echo -e "${BLUE}Starting frontend on http://localhost:3000...${NC}"